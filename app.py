@@ -1,9 +1,32 @@
 import os
-from flask import Flask, request, jsonify
+import sys
+import json
+import time
+import uuid
+import socket
+import random
+import sqlite3
+import hashlib
+import threading
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, Request, Response, request, jsonify
+import io
 import base64
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from metrics import (
+    QR_STAGE_SECONDS, HIGHLEVEL_REQUEST_SECONDS, timed, count_cache, instrument_app, metrics_response
+)
+from qr_render import render_qr_image, render_qr_batch_item
 
 app = Flask(__name__)
+instrument_app(app, 'worker')
 
 # Version
 VERSION = "7.22-syntax-fix"
@@ -12,51 +35,321 @@ print(f"=== STARTING WORKER VERSION {VERSION} ===")
 
 @app.route('/health', methods=['GET'])
 def health():
+    """Liveness plus readiness: 503 "warming" until this process finished warm-up"""
+    ready = _warmup_ready.is_set()
     return jsonify({
-        'status': 'healthy',
-        'version': VERSION
-    })
+        'status': 'healthy' if ready else 'warming',
+        'version': VERSION,
+        'warmup': dict(_warmup_state),
+        'qr_cache': qr_cache.stats(),
+        'highlevel_limits': get_highlevel_client().limit_stats()
+    }), 200 if ready else 503
 
 
-@app.route('/generate-qr', methods=['POST'])
-def generate_qr():
-    """Generate QR code from URL and return base64 PNG"""
-    import qrcode
-    from PIL import Image
-    import io
+# QR image cache - bounded in-memory LRU per process, plus an optional
+# on-disk tier (QR_CACHE_DIR) that every gunicorn worker shares
+QR_CACHE_MAX_ENTRIES = int(os.environ.get('QR_CACHE_MAX_ENTRIES', 4096))
+QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR', '')
+QR_CACHE_DISK_MAX_BYTES = int(os.environ.get('QR_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+QR_ERROR_CORRECTION = 'H'
 
-    data = request.get_json()
+
+def qr_cache_key(url, size, border_size, image_format='png', error_correction=QR_ERROR_CORRECTION):
+    """Content address for a rendered QR image"""
+    raw = json.dumps([url, size, border_size, image_format, error_correction], separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class QRImageCache:
+    """Two-tier cache of rendered QR images keyed by qr_cache_key()"""
+
+    def __init__(self, max_entries, disk_dir='', disk_max_bytes=0):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        # Bytes this process wrote since its last prune; a tenth of the cap triggers one
+        self._disk_written = 0
+        self._disk_pruning = False
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count_cache('qr', 'hit')
+                return data
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # mtime doubles as last use, so pruning drops the coldest files
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.disk_hits += 1
+                count_cache('qr', 'disk_hit')
+                return data
+
+        with self._lock:
+            self.misses += 1
+        count_cache('qr', 'miss')
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: QR disk cache write failed: {e}")
+            return
+
+        if self.disk_max_bytes > 0:
+            with self._lock:
+                self._disk_written += len(data)
+                due = self._disk_written >= self.disk_max_bytes / 10 and not self._disk_pruning
+                if due:
+                    self._disk_written = 0
+                    self._disk_pruning = True
+            if due:
+                threading.Thread(target=self.prune_disk, name='qr-cache-prune', daemon=True).start()
+
+    def prune_disk(self):
+        """Delete the least recently used files until the disk tier is under 90% of its cap"""
+        try:
+            files = []
+            total = 0
+            for root, _, names in os.walk(self.disk_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.disk_max_bytes:
+                return
+            target = self.disk_max_bytes * 0.9
+            removed = 0
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            with self._lock:
+                self.disk_evictions += removed
+            print(f"QR disk cache pruned {removed} files, {total // 1024} KB left")
+        except Exception as e:
+            print(f"Warning: QR disk cache prune failed: {e}")
+        finally:
+            with self._lock:
+                self._disk_pruning = False
+
+    def _remember(self, key, data):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_tier': bool(self.disk_dir),
+                'disk_evictions': self.disk_evictions
+            }
+
+
+qr_cache = QRImageCache(QR_CACHE_MAX_ENTRIES, QR_CACHE_DIR, QR_CACHE_DISK_MAX_BYTES)
+
+
+# QR rendering lives in qr_render.py, which the batch process pool imports
+# instead of this whole app
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+# Upper bounds on caller-supplied dimensions - /qr is a public, linkable GET
+QR_MAX_SIZE = int(os.environ.get('QR_MAX_SIZE', 4000))
+QR_MAX_BORDER_SIZE = int(os.environ.get('QR_MAX_BORDER_SIZE', 40))
+
+# Raw image responses are content-addressed, so they never go stale
+QR_HTTP_CACHE_CONTROL = os.environ.get('QR_HTTP_CACHE_CONTROL', 'public, max-age=31536000, immutable')
+
+# QR batch rendering - CPU-bound work is spread over a process pool. Every
+# web process has its own pool, so by default the cores are split between
+# them (gunicorn.conf.py exports GUNICORN_WORKERS)
+QR_POOL_WORKERS = int(os.environ.get(
+    'QR_POOL_WORKERS', max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('GUNICORN_WORKERS', 1))))
+))
+QR_BATCH_MAX_ITEMS = int(os.environ.get('QR_BATCH_MAX_ITEMS', 5000))
+
+_qr_pool = None
+_qr_pool_lock = threading.Lock()
+
+
+def get_qr_image(url, size=400, border_size=4, image_format='png'):
+    """Return the image bytes for a QR code, rendering only on a cache miss"""
+    key = qr_cache_key(url, size, border_size, image_format)
+    image_bytes = qr_cache.get(key)
+    if image_bytes is None:
+        image_bytes = render_qr_image(url, size, border_size, image_format)
+        qr_cache.put(key, image_bytes)
+    return image_bytes
+
+
+def qr_data_url(image_bytes, image_format='png'):
+    """Encode rendered QR bytes as the data: URL the JSON endpoints return"""
+    with timed(QR_STAGE_SECONDS, stage='base64'):
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+    return f"data:{QR_FORMATS[image_format]};base64,{base64_image}"
+
+
+def parse_qr_params(data):
+    """Pull (url, size, border_size, format) out of a request body
+
+    Raises ValueError with a caller-facing message when the values are unusable.
+    """
     url = data.get('url', '')
     size = data.get('size', 400)
     border_size = data.get('border_size', 4)
+    image_format = str(data.get('format', 'png')).lower()
 
     if not url:
-        return jsonify({"error": "URL is required", "success": False}), 400
+        raise ValueError("URL is required")
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool)):
+        raise ValueError("size must be an integer")
+    if size is not None and size > QR_MAX_SIZE:
+        raise ValueError(f"size must be at most {QR_MAX_SIZE}")
+    if not isinstance(border_size, int) or isinstance(border_size, bool) or border_size < 0:
+        raise ValueError("border_size must be a non-negative integer")
+    if border_size > QR_MAX_BORDER_SIZE:
+        raise ValueError(f"border_size must be at most {QR_MAX_BORDER_SIZE}")
+    if image_format not in QR_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(QR_FORMATS)}")
 
-    try:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=border_size,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
+    return url, size, border_size, image_format
+
+
+def qr_batch_result(index, url, size, image_format, image_bytes):
+    """Build the NDJSON line for a successfully rendered batch item"""
+    return {
+        "index": index,
+        "success": True,
+        "qr_image": qr_data_url(image_bytes, image_format),
+        "qr_url": url,
+        "size": size
+    }
+
+
+def qr_binary_response(url, size, border_size, image_format):
+    """Raw image response with a strong ETag; conditional requests skip rendering"""
+    etag = qr_cache_key(url, size, border_size, image_format)
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        image_bytes = get_qr_image(url, size, border_size, image_format)
+        response = Response(image_bytes, mimetype=QR_FORMATS[image_format])
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = QR_HTTP_CACHE_CONTROL
+    return response
+
+
+def get_qr_pool():
+    """Lazily create the QR process pool (spawned, so it is safe alongside threads)"""
+    global _qr_pool
+    with _qr_pool_lock:
+        if _qr_pool is None:
+            _qr_pool = ProcessPoolExecutor(
+                max_workers=max(1, QR_POOL_WORKERS),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            print(f"Started QR process pool with {max(1, QR_POOL_WORKERS)} workers")
+        return _qr_pool
 
-        qr_image = qr.make_image(fill_color="black", back_color="white")
 
-        if size and size > 0:
-            qr_image = qr_image.resize((size, size), Image.Resampling.LANCZOS)
+def discard_qr_pool(pool):
+    """Drop a broken pool (if it is still the current one) so the next batch starts a fresh one"""
+    global _qr_pool
+    with _qr_pool_lock:
+        if _qr_pool is not pool:
+            return
+        _qr_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
 
-        buffer = io.BytesIO()
-        qr_image.save(buffer, format="PNG")
-        base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+@app.route('/generate-qr', methods=['POST'])
+def generate_qr():
+    """Generate QR code from URL and return it as a base64 data URL (PNG or SVG)
+
+    Callers that send Accept: image/png or image/svg+xml get the raw image
+    bytes instead of the JSON envelope.
+    """
+    data = request.get_json()
+
+    try:
+        url, size, border_size, image_format = parse_qr_params(data)
+    except ValueError as e:
+        return jsonify({"error": str(e), "success": False}), 400
+
+    accepted = request.accept_mimetypes.best_match(['application/json'] + list(QR_FORMATS.values()))
+    for binary_format, mimetype in QR_FORMATS.items():
+        if accepted == mimetype:
+            try:
+                return qr_binary_response(url, size, border_size, binary_format)
+            except Exception as e:
+                print(f"QR generation error: {e}")
+                return jsonify({"error": str(e), "success": False}), 500
+
+    try:
+        image_bytes = get_qr_image(url, size, border_size, image_format)
 
         print(f"Generated QR code for URL: {url[:50]}...")
 
         return jsonify({
             "success": True,
-            "qr_image": f"data:image/png;base64,{base64_image}",
+            "qr_image": qr_data_url(image_bytes, image_format),
             "qr_url": url,
             "size": size
         })
@@ -66,61 +359,506 @@ def generate_qr():
         return jsonify({"error": str(e), "success": False}), 500
 
 
-@app.route('/update-highlevel-contact', methods=['POST'])
-def update_highlevel_contact():
-    """Update HighLevel contact with trigger URL, QR data, and neighbor info"""
+@app.route('/qr', methods=['GET'])
+def qr_image():
+    """Cacheable QR image: GET /qr?url=...&size=400&border_size=4&format=png"""
+    params = dict(request.args)
+    for name in ('size', 'border_size'):
+        if name in params:
+            try:
+                params[name] = int(params[name])
+            except ValueError:
+                return jsonify({"error": f"{name} must be an integer", "success": False}), 400
 
-    data = request.json
-    print("=== UPDATE HIGHLEVEL CONTACT ===")
-    print(f"Received data: {data}")
+    try:
+        url, size, border_size, image_format = parse_qr_params(params)
+    except ValueError as e:
+        return jsonify({"error": str(e), "success": False}), 400
 
-    contact_id = data.get('contact_id')
-    trigger_url = data.get('trigger_url')  # Full URL for QR code
-    qr_image_base64 = data.get('qr_image')  # Base64 encoded QR image
-    neighbor_tag = data.get('neighbor_tag')
+    try:
+        return qr_binary_response(url, size, border_size, image_format)
+    except Exception as e:
+        print(f"QR generation error: {e}")
+        return jsonify({"error": str(e), "success": False}), 500
 
-    # Validate required fields
-    if not contact_id:
-        print("ERROR: No contact_id provided")
-        return jsonify({"error": "contact_id is required", "success": False}), 400
 
-    if not trigger_url:
-        print("ERROR: No trigger_url provided")
-        return jsonify({"error": "trigger_url is required", "success": False}), 400
+@app.route('/generate-qr/batch', methods=['POST'])
+def generate_qr_batch():
+    """Generate many QR codes on the process pool, streaming NDJSON in completion order
 
-    # HighLevel API configuration
-    hl_token = os.environ.get('HIGHLEVEL_TOKEN', 'pit-b553bc1f-b684-4032-ab89-f5fe5550881d')
-    location_id = 'XBny1dU0QeSvwdTLiMBu'
+    Body: {"items": [{"url": ..., "size": 400, "border_size": 4, "format": "png"}, ...]}
+    or a bare list. Each output line carries the item's "index" so callers can
+    match results up.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
 
-    headers = {
-        "Authorization": f"Bearer {hl_token}",
-        "Content-Type": "application/json",
-        "Version": "2021-07-28"
-    }
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list", "success": False}), 400
 
-    # Custom field IDs from HighLevel
-    field_ids = {
-        "custom_preview_url_triggerlink": "yhS3VdK90AqkuaDzUwbV",
-        "custom_preview_qr_url": "Cy3UNg2N0zTql32AxKo9",
-        "custom_preview_qr_image": "Qx6Tl0WiqtpuaxfnKkhU",
-        "installed_neighbor_lastname": "HmGAlm8iqMIx66Ymvcte"
-    }
+    if len(items) > QR_BATCH_MAX_ITEMS:
+        return jsonify({
+            "error": f"Too many items ({len(items)}), max is {QR_BATCH_MAX_ITEMS}",
+            "success": False
+        }), 413
+
+    # Validate up front so bad items are reported without touching the pool
+    rejected = []
+    cached = []
+    tasks = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("item must be an object")
+            url, size, border_size, image_format = parse_qr_params(item)
+        except ValueError as e:
+            result = {"index": index, "success": False, "error": str(e)}
+            if isinstance(item, dict) and item.get('url'):
+                result["qr_url"] = item['url']
+            rejected.append(result)
+            continue
+        image_bytes = qr_cache.get(qr_cache_key(url, size, border_size, image_format))
+        if image_bytes is not None:
+            cached.append(qr_batch_result(index, url, size, image_format, image_bytes))
+            continue
+        tasks.append((index, url, size, border_size, image_format))
+
+    print(f"QR batch: {len(tasks)} items queued, {len(cached)} cached, {len(rejected)} rejected")
+
+    def stream():
+        pool = get_qr_pool() if tasks else None
+        try:
+            futures = {pool.submit(render_qr_batch_item, *task): task for task in tasks}
+        except BrokenProcessPool as e:
+            # Broke since the last batch (e.g. a child was killed) - start a fresh one
+            print(f"QR process pool broke, recreating: {e}")
+            discard_qr_pool(pool)
+            pool = get_qr_pool()
+            futures = {pool.submit(render_qr_batch_item, *task): task for task in tasks}
+        try:
+            for result in rejected + cached:
+                yield json.dumps(result) + "\n"
+            for future in as_completed(futures):
+                index, url, size, border_size, image_format = futures[future]
+                try:
+                    rendered = future.result()
+                except Exception as e:
+                    rendered = {"index": index, "error": str(e)}
+                    if isinstance(e, BrokenProcessPool) and _qr_pool is pool:
+                        print(f"QR process pool broke, recreating: {e}")
+                        discard_qr_pool(pool)
+
+                if 'image' in rendered:
+                    qr_cache.put(qr_cache_key(url, size, border_size, image_format), rendered['image'])
+                    result = qr_batch_result(index, url, size, image_format, rendered['image'])
+                else:
+                    result = {"index": index, "success": False, "qr_url": url, "error": rendered['error']}
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client went away - don't keep rendering for nobody
+            for future in futures:
+                future.cancel()
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+
+# HighLevel API client - one pooled keep-alive session per worker process,
+# so contact updates reuse TLS connections instead of handshaking per call
+HIGHLEVEL_BASE_URL = os.environ.get('HIGHLEVEL_BASE_URL', 'https://services.leadconnectorhq.com').rstrip('/')
+HIGHLEVEL_TOKEN = os.environ.get('HIGHLEVEL_TOKEN', 'pit-b553bc1f-b684-4032-ab89-f5fe5550881d')
+HIGHLEVEL_LOCATION_ID = 'XBny1dU0QeSvwdTLiMBu'
+HIGHLEVEL_API_VERSION = '2021-07-28'
+HIGHLEVEL_POOL_SIZE = int(os.environ.get('HIGHLEVEL_POOL_SIZE', 20))
+HIGHLEVEL_KEEPALIVE = os.environ.get('HIGHLEVEL_KEEPALIVE', '1') != '0'
+HIGHLEVEL_KEEPALIVE_IDLE = int(os.environ.get('HIGHLEVEL_KEEPALIVE_IDLE', 60))
+HIGHLEVEL_CONNECT_TIMEOUT = float(os.environ.get('HIGHLEVEL_CONNECT_TIMEOUT', 5))
+HIGHLEVEL_READ_TIMEOUT = float(os.environ.get('HIGHLEVEL_READ_TIMEOUT', 30))
+HIGHLEVEL_UPLOAD_READ_TIMEOUT = float(os.environ.get('HIGHLEVEL_UPLOAD_READ_TIMEOUT', 60))
+HIGHLEVEL_STEP_WORKERS = int(os.environ.get('HIGHLEVEL_STEP_WORKERS', 32))
+
+# HighLevel rate limiting - one token bucket per (location, endpoint), kept in
+# the worker's SQLite file so every process on the host draws from it, plus
+# an adaptive concurrency limit per process
+HIGHLEVEL_SHARED_RATE_LIMIT = os.environ.get('HIGHLEVEL_SHARED_RATE_LIMIT', '1') != '0'
+HIGHLEVEL_RATE_PER_SECOND = float(os.environ.get('HIGHLEVEL_RATE_PER_SECOND', 10))
+HIGHLEVEL_RATE_BURST = float(os.environ.get('HIGHLEVEL_RATE_BURST', 10))
+HIGHLEVEL_RATE_BATCH = int(os.environ.get('HIGHLEVEL_RATE_BATCH', 5))
+HIGHLEVEL_RATE_RESERVE_SECONDS = float(os.environ.get('HIGHLEVEL_RATE_RESERVE_SECONDS', 1))
+HIGHLEVEL_MAX_CONCURRENCY = int(os.environ.get('HIGHLEVEL_MAX_CONCURRENCY', 16))
+HIGHLEVEL_MIN_CONCURRENCY = int(os.environ.get('HIGHLEVEL_MIN_CONCURRENCY', 1))
+HIGHLEVEL_MAX_RETRIES = int(os.environ.get('HIGHLEVEL_MAX_RETRIES', 4))
+HIGHLEVEL_BACKOFF_BASE = float(os.environ.get('HIGHLEVEL_BACKOFF_BASE', 0.5))
+HIGHLEVEL_BACKOFF_MAX = float(os.environ.get('HIGHLEVEL_BACKOFF_MAX', 30))
+
+# Custom field IDs from HighLevel
+HIGHLEVEL_FIELD_IDS = {
+    "custom_preview_url_triggerlink": "yhS3VdK90AqkuaDzUwbV",
+    "custom_preview_qr_url": "Cy3UNg2N0zTql32AxKo9",
+    "custom_preview_qr_image": "Qx6Tl0WiqtpuaxfnKkhU",
+    "installed_neighbor_lastname": "HmGAlm8iqMIx66Ymvcte"
+}
+
+# Bulk contact updates
+HIGHLEVEL_BATCH_CONCURRENCY = int(os.environ.get('HIGHLEVEL_BATCH_CONCURRENCY', 8))
+HIGHLEVEL_BATCH_MAX_CONCURRENCY = int(os.environ.get('HIGHLEVEL_BATCH_MAX_CONCURRENCY', 32))
+HIGHLEVEL_BATCH_MAX_ITEMS = int(os.environ.get('HIGHLEVEL_BATCH_MAX_ITEMS', 5000))
+
+_highlevel_client = None
+_highlevel_client_pid = None
+_highlevel_executor = None
+_highlevel_executor_pid = None
+_highlevel_client_lock = threading.Lock()
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that turns on TCP keep-alive probes for pooled sockets"""
 
-    short_trigger_url = trigger_url  # Default to full URL
-    qr_image_url = None
+    def __init__(self, keepalive_idle=60, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
 
-    # Step 1: Create HighLevel Trigger Link (short URL)
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = list(HTTPConnection.default_socket_options)
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle))
+        kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class TokenBucket:
+    """Blocking token bucket; pause() holds every caller back after a 429"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate if self.rate > 0 else 1)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit - halves on a 429, creeps back up on success"""
+
+    def __init__(self, initial, minimum, maximum):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.throttled = 0
+        self.last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                # A burst of 429s from one window only counts as one signal
+                now = time.monotonic()
+                if now - self.last_decrease >= 1.0:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                # Roughly +1 per limit's worth of successful calls
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def retry_after_seconds(response):
+    """Parse Retry-After (delta-seconds or HTTP-date), or None when absent"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
     try:
-        print("Creating HighLevel trigger link...")
-        link_response = requests.post(
-            'https://services.leadconnectorhq.com/links/',
-            headers=headers,
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class MultipartFileStream:
+    """multipart/form-data body that reads its file part lazily
+
+    requests' files= builds the whole body in memory; this streams the file
+    (typically a spooled temp file) in chunks with a known Content-Length.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, fields, file_field, filename, file_obj, content_type):
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = b''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode('utf-8')
+            for key, value in fields.items()
+        )
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._parts = [head, file_obj, f'\r\n--{boundary}--\r\n'.encode('utf-8')]
+
+        file_obj.seek(0, os.SEEK_END)
+        self.length = len(head) + file_obj.tell() + len(self._parts[2])
+        self.rewind()
+
+    def rewind(self):
+        self._parts[1].seek(0)
+        self._index = 0
+        self._offset = 0
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        chunks = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+            else:
+                chunk = part.read(size)
+            if not chunk:
+                self._index += 1
+                self._offset = 0
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class HighLevelClient:
+    """Thin wrapper over the HighLevel endpoints this worker calls
+
+    Every call passes through the (location, endpoint) token bucket and
+    adaptive concurrency limit, and 429s are retried after Retry-After or a
+    jittered exponential backoff.
+    """
+
+    def __init__(self, token, base_url=HIGHLEVEL_BASE_URL, pool_size=HIGHLEVEL_POOL_SIZE,
+                 keepalive=HIGHLEVEL_KEEPALIVE, connect_timeout=HIGHLEVEL_CONNECT_TIMEOUT,
+                 read_timeout=HIGHLEVEL_READ_TIMEOUT, upload_read_timeout=HIGHLEVEL_UPLOAD_READ_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.upload_timeout = (connect_timeout, upload_read_timeout)
+
+        if keepalive:
+            adapter = KeepAliveAdapter(HIGHLEVEL_KEEPALIVE_IDLE, pool_connections=4, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Version": HIGHLEVEL_API_VERSION
+        })
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
+
+        self._buckets = {}
+        self._limits = {}
+        self._limits_lock = threading.Lock()
+
+    def _limiters(self, location_id, endpoint):
+        key = (location_id, endpoint)
+        with self._limits_lock:
+            if key not in self._buckets:
+                if HIGHLEVEL_SHARED_RATE_LIMIT:
+                    self._buckets[key] = SharedTokenBucket(
+                        rate_buckets, f"{location_id}:{endpoint}", HIGHLEVEL_RATE_PER_SECOND, HIGHLEVEL_RATE_BURST,
+                        HIGHLEVEL_RATE_BATCH, HIGHLEVEL_RATE_RESERVE_SECONDS
+                    )
+                else:
+                    self._buckets[key] = TokenBucket(HIGHLEVEL_RATE_PER_SECOND, HIGHLEVEL_RATE_BURST)
+                self._limits[key] = AdaptiveLimit(
+                    HIGHLEVEL_MAX_CONCURRENCY, HIGHLEVEL_MIN_CONCURRENCY, HIGHLEVEL_MAX_CONCURRENCY
+                )
+            return self._buckets[key], self._limits[key]
+
+    def _request(self, location_id, endpoint, method, url, **kwargs):
+        bucket, limit = self._limiters(location_id, endpoint)
+
+        for attempt in range(HIGHLEVEL_MAX_RETRIES + 1):
+            # Uploads are re-sent from the start of the file on retry
+            if isinstance(kwargs.get('data'), MultipartFileStream):
+                kwargs['data'].rewind()
+
+            bucket.acquire()
+            limit.acquire()
+            throttled = False
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                response = self.session.request(method, url, **kwargs)
+                status = str(response.status_code)
+                throttled = response.status_code == 429
+            finally:
+                limit.release(throttled)
+                HIGHLEVEL_REQUEST_SECONDS.labels(endpoint=endpoint, status=status).observe(time.perf_counter() - started)
+
+            if not throttled or attempt == HIGHLEVEL_MAX_RETRIES:
+                return response
+
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = random.uniform(0, min(HIGHLEVEL_BACKOFF_MAX, HIGHLEVEL_BACKOFF_BASE * 2 ** attempt))
+            delay = min(delay, HIGHLEVEL_BACKOFF_MAX)
+            bucket.pause(delay)
+            print(f"HighLevel 429 on {endpoint} ({location_id}), retry {attempt + 1} in {delay:.2f}s")
+
+        return response
+
+    def limit_stats(self):
+        with self._limits_lock:
+            return {
+                f"{location_id}:{endpoint}": {
+                    'concurrency_limit': int(limit.limit),
+                    'in_flight': limit.in_flight,
+                    'throttled': limit.throttled
+                }
+                for (location_id, endpoint), limit in self._limits.items()
+            }
+
+    def create_link(self, location_id, name, redirect_to):
+        return self._request(
+            location_id, 'links', 'POST',
+            f"{self.base_url}/links/",
             json={
                 "locationId": location_id,
-                "name": f"Preview Link - {contact_id[:8]}",
-                "redirectTo": trigger_url
+                "name": name,
+                "redirectTo": redirect_to
             },
-            timeout=30
+            timeout=self.timeout
+        )
+
+    def upload_media(self, location_id, name, file_obj, filename='qr_code.png', content_type='image/png'):
+        body = MultipartFileStream(
+            {'locationId': location_id, 'name': name},
+            'file', filename, file_obj, content_type
+        )
+        return self._request(
+            location_id, 'medias', 'POST',
+            f"{self.base_url}/medias/upload-file",
+            data=body,
+            headers={'Content-Type': body.content_type},
+            timeout=self.upload_timeout
+        )
+
+    def update_contact(self, contact_id, payload, location_id=HIGHLEVEL_LOCATION_ID):
+        return self._request(
+            location_id, 'contacts', 'PUT',
+            f"{self.base_url}/contacts/{contact_id}",
+            json=payload,
+            timeout=self.timeout
+        )
+
+
+def get_highlevel_client():
+    """Per-process HighLevel client - rebuilt after a fork so sockets are never shared"""
+    global _highlevel_client, _highlevel_client_pid
+    with _highlevel_client_lock:
+        if _highlevel_client is None or _highlevel_client_pid != os.getpid():
+            _highlevel_client = HighLevelClient(HIGHLEVEL_TOKEN)
+            _highlevel_client_pid = os.getpid()
+        return _highlevel_client
+
+
+def get_highlevel_executor():
+    """Per-process thread pool for running independent HighLevel calls side by side"""
+    global _highlevel_executor, _highlevel_executor_pid
+    with _highlevel_client_lock:
+        if _highlevel_executor is None or _highlevel_executor_pid != os.getpid():
+            _highlevel_executor = ThreadPoolExecutor(
+                max_workers=max(2, HIGHLEVEL_STEP_WORKERS),
+                thread_name_prefix='highlevel'
+            )
+            _highlevel_executor_pid = os.getpid()
+        return _highlevel_executor
+
+
+def file_sha256(file_obj):
+    """Hash a seekable file in chunks, leaving it rewound"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(64 * 1024), b''):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def index_lookup(kind, location_id, key):
+    """upstream_index.get that only logs on error - a lookup failure just means doing the work"""
+    try:
+        return upstream_index.get(kind, location_id, key)
+    except Exception as e:
+        print(f"Warning: Upstream index lookup failed: {str(e)}")
+        return None
+
+
+def index_remember(kind, location_id, key, value):
+    """upstream_index.put that only logs on error - the upstream result is still used"""
+    try:
+        upstream_index.put(kind, location_id, key, value, UPSTREAM_INDEX_TTLS[kind])
+    except Exception as e:
+        print(f"Warning: Upstream index write failed: {str(e)}")
+
+
+def create_trigger_link(highlevel, location_id, contact_id, trigger_url):
+    """Step 1: create a HighLevel trigger link, falling back to the full URL
+
+    A link already created for the same redirect URL is reused.
+    """
+    short_trigger_url = index_lookup('link', location_id, trigger_url)
+    if short_trigger_url:
+        print(f"Reusing trigger link: {short_trigger_url}")
+        return short_trigger_url
+
+    try:
+        print("Creating HighLevel trigger link...")
+        link_response = highlevel.create_link(
+            location_id,
+            f"Preview Link - {contact_id[:8]}",
+            trigger_url
         )
         if link_response.status_code == 200 or link_response.status_code == 201:
             link_data = link_response.json()
@@ -129,58 +867,151 @@ def update_highlevel_contact():
                 # Construct the short URL format
                 short_trigger_url = link_data.get("link", {}).get("fieldKey", trigger_url)
                 print(f"Created short trigger link: {short_trigger_url}")
+                if short_trigger_url != trigger_url:
+                    index_remember('link', location_id, trigger_url, short_trigger_url)
+                return short_trigger_url
         else:
             print(f"Warning: Could not create trigger link: {link_response.text}")
     except Exception as e:
         print(f"Warning: Trigger link creation failed: {str(e)}")
 
-    # Step 2: Upload QR Image to HighLevel Media
-    if qr_image_base64:
-        try:
-            print("Uploading QR image to HighLevel...")
-            import base64
-            import io
+    return trigger_url
+
+
+def upload_qr_image(highlevel, location_id, contact_id, qr_image_base64=None, qr_params=None, qr_file=None):
+    """Step 2: upload the QR image to HighLevel media, returning its URL or None
 
+    The image comes from qr_file (a seekable file, streamed as-is), from
+    qr_params (url, size, border_size, rendered in-process with no base64
+    round trip) or from qr_image_base64. Identical image bytes already
+    uploaded to this location are not re-sent.
+    """
+    try:
+        if qr_file is not None:
+            image_file = qr_file
+        elif qr_params is not None:
+            image_file = io.BytesIO(get_qr_image(*qr_params))
+        else:
             # Decode base64 image
             # Handle data URL format if present
             if ',' in qr_image_base64:
                 qr_image_base64 = qr_image_base64.split(',')[1]
 
-            image_data = base64.b64decode(qr_image_base64)
+            image_file = io.BytesIO(base64.b64decode(qr_image_base64))
 
-            # Upload to HighLevel media
-            files = {
-                'file': ('qr_code.png', io.BytesIO(image_data), 'image/png')
-            }
-            upload_data = {
-                'locationId': location_id,
-                'name': f'QR_Code_{contact_id[:8]}'
-            }
+        content_hash = file_sha256(image_file)
 
-            upload_headers = {
-                "Authorization": f"Bearer {hl_token}",
-                "Version": "2021-07-28"
-            }
+        qr_image_url = index_lookup('media', location_id, content_hash)
+        if qr_image_url:
+            print(f"Reusing uploaded QR image: {qr_image_url}")
+            return qr_image_url
 
-            upload_response = requests.post(
-                'https://services.leadconnectorhq.com/medias/upload-file',
-                headers=upload_headers,
-                files=files,
-                data=upload_data,
-                timeout=60
-            )
+        print("Uploading QR image to HighLevel...")
 
-            if upload_response.status_code == 200 or upload_response.status_code == 201:
-                upload_result = upload_response.json()
-                qr_image_url = upload_result.get('url')
-                print(f"Uploaded QR image: {qr_image_url}")
-            else:
-                print(f"Warning: QR image upload failed: {upload_response.text}")
+        # Upload to HighLevel media
+        upload_response = highlevel.upload_media(
+            location_id,
+            f'QR_Code_{contact_id[:8]}',
+            image_file
+        )
+
+        if upload_response.status_code == 200 or upload_response.status_code == 201:
+            upload_result = upload_response.json()
+            qr_image_url = upload_result.get('url')
+            print(f"Uploaded QR image: {qr_image_url}")
+            if qr_image_url:
+                index_remember('media', location_id, content_hash, qr_image_url)
+            return qr_image_url
+        else:
+            print(f"Warning: QR image upload failed: {upload_response.text}")
+    except Exception as e:
+        print(f"Warning: QR image upload failed: {str(e)}")
+
+    return None
+
+
+def batch_contact_update(data):
+    """Run one batch item and reduce it to the per-contact NDJSON fields"""
+    if not isinstance(data, dict):
+        data = {}
+        result, status = {"success": False, "error": "contact payload must be an object"}, 400
+    else:
+        try:
+            result, status = process_contact_update(data)
         except Exception as e:
-            print(f"Warning: QR image upload failed: {str(e)}")
+            result, status = {"success": False, "error": str(e)}, 500
+
+    return {
+        "contact_id": data.get('contact_id'),
+        "success": result.get('success', False),
+        "status": result.get('status', status),
+        "short_trigger_url": result.get('short_trigger_url'),
+        "qr_image_url": result.get('qr_image_url'),
+        "error": result.get('error')
+    }
+
+
+def process_contact_update(data, qr_file=None):
+    """Update HighLevel contact with trigger URL, QR data, and neighbor info
+
+    qr_file is an already-received image file (multipart or raw body).
+    Returns (response_body, status_code) so the single, batch and queued
+    paths all share the same behaviour.
+    """
+    print("=== UPDATE HIGHLEVEL CONTACT ===")
+    # Never dump qr_image - it can be a multi-kilobyte base64 string
+    summary = {key: value for key, value in data.items() if key != 'qr_image'}
+    if data.get('qr_image'):
+        summary['qr_image'] = f"<{len(data['qr_image'])} base64 chars>"
+    if qr_file is not None:
+        summary['qr_image'] = "<uploaded file>"
+    print(f"Received data: {summary}")
+
+    contact_id = data.get('contact_id')
+    trigger_url = data.get('trigger_url')  # Full URL for QR code
+    qr_image_base64 = data.get('qr_image')  # Base64 encoded QR image
+    neighbor_tag = data.get('neighbor_tag')
+
+    # Validate required fields
+    if not contact_id:
+        print("ERROR: No contact_id provided")
+        return {"error": "contact_id is required", "success": False}, 400
+
+    if not trigger_url:
+        print("ERROR: No trigger_url provided")
+        return {"error": "trigger_url is required", "success": False}, 400
+
+    # "qr": {"size": 400, "border_size": 4} (or true) renders the image here
+    # instead of the caller posting a base64 qr_image from /generate-qr
+    qr_params = None
+    if qr_file is None and not qr_image_base64 and data.get('qr'):
+        qr_options = data['qr'] if isinstance(data['qr'], dict) else {}
+        try:
+            url, size, border_size, image_format = parse_qr_params({'url': trigger_url, **qr_options})
+        except ValueError as e:
+            return {"error": f"Invalid qr options: {e}", "success": False}, 400
+        if image_format != 'png':
+            return {"error": "Invalid qr options: only png can be uploaded", "success": False}, 400
+        qr_params = (url, size, border_size)
+
+    highlevel = get_highlevel_client()
+    location_id = HIGHLEVEL_LOCATION_ID
+
+    field_ids = HIGHLEVEL_FIELD_IDS
+
+    # Steps 1 and 2 don't depend on each other, so run them concurrently
+    executor = get_highlevel_executor()
+    link_future = executor.submit(create_trigger_link, highlevel, location_id, contact_id, trigger_url)
+    upload_future = None
+    if qr_file is not None or qr_image_base64 or qr_params:
+        upload_future = executor.submit(
+            upload_qr_image, highlevel, location_id, contact_id, qr_image_base64, qr_params, qr_file
+        )
+
+    short_trigger_url = link_future.result()
+    qr_image_url = upload_future.result() if upload_future else None
 
     # Step 3: Update Contact with all fields
-    contact_url = f"https://services.leadconnectorhq.com/contacts/{contact_id}"
 
     custom_fields = [
         {
@@ -216,17 +1047,17 @@ def update_highlevel_contact():
     if neighbor_tag:
         payload["tags"] = [neighbor_tag]
 
-    print(f"Updating contact: {contact_url}")
+    print(f"Updating contact: {contact_id}")
     print(f"Payload: {payload}")
 
     try:
-        response = requests.put(contact_url, json=payload, headers=headers, timeout=30)
+        response = highlevel.update_contact(contact_id, payload, location_id)
 
         print(f"Response Status: {response.status_code}")
 
         if response.status_code == 200:
             print("SUCCESS: Contact updated")
-            return jsonify({
+            return {
                 "success": True,
                 "status": response.status_code,
                 "contact_id": contact_id,
@@ -234,24 +1065,743 @@ def update_highlevel_contact():
                 "short_trigger_url": short_trigger_url,
                 "qr_url": trigger_url,
                 "qr_image_url": qr_image_url
-            })
+            }, 200
         else:
             error_text = response.text
             print(f"ERROR: {error_text}")
-            return jsonify({
+            return {
                 "success": False,
                 "status": response.status_code,
                 "error": error_text
-            }), response.status_code
+            }, response.status_code
 
     except requests.exceptions.Timeout:
         print("ERROR: Request timeout")
-        return jsonify({"success": False, "error": "Request timeout"}), 504
+        return {"success": False, "error": "Request timeout"}, 504
     except Exception as e:
         print(f"ERROR: {str(e)}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        return {"success": False, "error": str(e)}, 500
+
+
+# Background job queue - contact updates can be queued in a local SQLite file
+# and processed by worker threads, so slow HighLevel calls never hold a web
+# request open and queued work survives a restart
+WORKER_DB_PATH = os.environ.get('WORKER_DB_PATH', 'worker.sqlite3')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_RETRY_BASE = float(os.environ.get('JOB_RETRY_BASE', 10))
+JOB_RETRY_MAX = float(os.environ.get('JOB_RETRY_MAX', 600))
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+# Binary QR intake on /update-highlevel-contact
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', 256 * 1024))
+
+# Upstream idempotency index TTLs (seconds, 0 disables that kind)
+UPSTREAM_INDEX_TTLS = {
+    'link': int(os.environ.get('UPSTREAM_LINK_TTL', 30 * 24 * 3600)),
+    'media': int(os.environ.get('UPSTREAM_MEDIA_TTL', 30 * 24 * 3600))
+}
+
+_job_workers = []
+_job_workers_pid = None
+_job_workers_lock = threading.Lock()
+_job_wakeup = threading.Event()
+
+
+class SQLiteStore:
+    """Base for the worker's SQLite tables - one autocommit connection per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        raise NotImplementedError
+
+
+class JobQueue(SQLiteStore):
+    """Durable FIFO of jobs in SQLite, safe to share between worker processes
+
+    A claimed job holds a lease; if its worker dies the lease runs out and
+    another worker picks the job up again. A re-queued job waits until its
+    available_at before it can be claimed.
+    """
+
+    def _init_schema(self):
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                lease_until REAL,
+                available_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+        """)
+        # Databases created before retry backoff lack available_at
+        columns = {row['name'] for row in self._connect().execute("PRAGMA table_info(jobs)")}
+        if 'available_at' not in columns:
+            self._connect().execute("ALTER TABLE jobs ADD COLUMN available_at REAL")
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), now, now)
+        )
+        return job_id
+
+    def claim(self):
+        """Take the oldest runnable job (queued and due, or running with an expired lease)
+
+        Expired-lease jobs that already used JOB_MAX_ATTEMPTS are failed
+        instead, so a job that keeps killing its worker is not retried forever.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, lease_until = NULL "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (f"Worker lost the job on its last attempt ({JOB_MAX_ATTEMPTS})", now, now, JOB_MAX_ATTEMPTS)
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND (available_at IS NULL OR available_at <= ?)) "
+                "OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, lease_until = ? WHERE id = ?",
+                (now, now + JOB_LEASE_SECONDS, row['id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        job = dict(row)
+        job['attempts'] += 1
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def finish(self, job_id, status, result=None, error=None):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_until = NULL WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def renew(self, job_id):
+        """Extend a running job's lease so long jobs are not claimed a second time"""
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (now + JOB_LEASE_SECONDS, now, job_id)
+        )
+
+    def retry(self, job_id, delay, result=None, error=None):
+        """Put a claimed job back in the queue, claimable again after delay seconds"""
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status = 'queued', result = ?, error = ?, updated_at = ?, lease_until = NULL, "
+            "available_at = ? WHERE id = ?",
+            (json.dumps(result) if result is not None else None, error, now, now + delay, job_id)
+        )
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._public(row) if row else None
+
+    def list(self, status=None, limit=100):
+        if status:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._public(row) for row in rows]
+
+    def counts(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row['status']: row['n'] for row in rows})
+        return counts
+
+    @staticmethod
+    def _public(row):
+        # Payloads can hold base64 images, so they are never echoed back
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'available_at': row['available_at'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error']
+        }
+
+
+job_queue = JobQueue(WORKER_DB_PATH)
+
+
+class UpstreamIndex(SQLiteStore):
+    """Remembers HighLevel work already done so repeats can skip it
+
+    kind 'link' maps a redirect URL to its trigger link fieldKey, kind
+    'media' maps a sha256 of the image bytes to its uploaded media URL.
+    Entries are scoped to a location and expire after their kind's TTL.
+    """
+
+    def _init_schema(self):
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS upstream_index (
+                kind TEXT NOT NULL,
+                location_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (kind, location_id, key)
+            );
+        """)
+
+    def get(self, kind, location_id, key):
+        row = self._connect().execute(
+            "SELECT value FROM upstream_index WHERE kind = ? AND location_id = ? AND key = ? AND expires_at > ?",
+            (kind, location_id, key, time.time())
+        ).fetchone()
+        count_cache(f"upstream_{kind}", 'hit' if row else 'miss')
+        return row['value'] if row else None
+
+    def put(self, kind, location_id, key, value, ttl):
+        if ttl <= 0:
+            return
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO upstream_index (kind, location_id, key, value, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, location_id, key, value, now, now + ttl)
+        )
+
+    def _where(self, kind=None, key=None, expired_only=False):
+        clauses, params = [], []
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if key:
+            clauses.append("key = ?")
+            params.append(key)
+        if expired_only:
+            clauses.append("expires_at <= ?")
+            params.append(time.time())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def list(self, kind=None, limit=100):
+        where, params = self._where(kind)
+        rows = self._connect().execute(
+            f"SELECT * FROM upstream_index{where} ORDER BY created_at DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        now = time.time()
+        return [dict(row, expired=row['expires_at'] <= now) for row in rows]
+
+    def counts(self):
+        rows = self._connect().execute("SELECT kind, COUNT(*) AS n FROM upstream_index GROUP BY kind").fetchall()
+        counts = {kind: 0 for kind in UPSTREAM_INDEX_TTLS}
+        counts.update({row['kind']: row['n'] for row in rows})
+        return counts
+
+    def purge(self, kind=None, key=None, expired_only=False):
+        where, params = self._where(kind, key, expired_only)
+        return self._connect().execute(f"DELETE FROM upstream_index{where}", params).rowcount
+
+
+upstream_index = UpstreamIndex(WORKER_DB_PATH)
+
+
+class RateBuckets(SQLiteStore):
+    """Token bucket state shared by every process using the same database file"""
+
+    def _init_schema(self):
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                paused_until REAL NOT NULL DEFAULT 0
+            );
+        """)
+
+    def take(self, key, rate, capacity, count=1):
+        """Take up to count tokens; returns (tokens taken, seconds to wait before trying again if none)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Read the clock only once holding the write lock; a time taken
+            # while waiting for it could move updated_at backwards and
+            # refill the same interval twice
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at, paused_until FROM rate_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, paused_until = capacity, 0.0
+            if row is not None:
+                tokens = min(capacity, row['tokens'] + max(0.0, now - row['updated_at']) * rate)
+                paused_until = row['paused_until']
+            taken, wait = 0, 0.0
+            if now < paused_until or tokens < 1:
+                wait = max(paused_until - now, (min(count, capacity) - tokens) / rate if rate > 0 else 1)
+            else:
+                taken = min(count, int(tokens))
+                tokens -= taken
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, paused_until) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, paused_until)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return taken, wait
+
+    def pause(self, key, seconds):
+        until = time.time() + seconds
+        self._connect().execute(
+            "INSERT INTO rate_buckets (key, tokens, updated_at, paused_until) VALUES (?, 0, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET tokens = 0, updated_at = excluded.updated_at, "
+            "paused_until = MAX(paused_until, excluded.paused_until)",
+            (key, time.time(), until)
+        )
+
+
+class SharedTokenBucket:
+    """TokenBucket drop-in whose state lives in RateBuckets, so the rate holds across processes
+
+    Tokens are taken from the database up to batch at a time and handed out
+    locally. Only one thread per process goes to the database, and it waits
+    there for a whole batch while the bucket is empty, so request threads
+    and job workers don't queue on SQLite's write lock for every call.
+    Reserved tokens not used within reserve_seconds are dropped rather than
+    spent later as an extra burst.
+    """
+
+    def __init__(self, store, key, rate, burst, batch=1, reserve_seconds=1.0):
+        self.store = store
+        self.key = key
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.batch = max(1, min(int(batch), int(self.capacity)))
+        self.reserve_seconds = reserve_seconds
+        self._reserved = 0
+        self._reserved_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._reserved and time.monotonic() < self._reserved_until:
+                self._reserved -= 1
+                return
+            while True:
+                taken, wait = self.store.take(self.key, self.rate, self.capacity, self.batch)
+                if taken:
+                    self._reserved = taken - 1
+                    self._reserved_until = time.monotonic() + self.reserve_seconds
+                    return
+                # Sleep holding the lock; the other threads in this process
+                # wait on it and are then served from this batch
+                time.sleep(wait)
+
+    def pause(self, seconds):
+        # Not under the lock, which a waiting acquire() may hold
+        self._reserved = 0
+        self.store.pause(self.key, seconds)
+
+
+rate_buckets = RateBuckets(WORKER_DB_PATH)
+
+
+def renew_lease_until(job_id, done):
+    """Keep a running job's lease alive until done is set"""
+    while not done.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            job_queue.renew(job_id)
+        except Exception as e:
+            print(f"Job {job_id}: lease renewal failed: {e}")
+
+
+def run_job(job):
+    """Execute one claimed job and record the outcome, re-queueing retryable failures"""
+    print(f"Job {job['id']}: attempt {job['attempts']}")
+    # 429 retries and slow steps can outlast JOB_LEASE_SECONDS; without
+    # renewal another worker would claim the job and apply it twice
+    done = threading.Event()
+    threading.Thread(target=renew_lease_until, args=(job['id'], done), daemon=True).start()
+    try:
+        result, status = process_contact_update(job['payload'])
+    except Exception as e:
+        result, status = {"success": False, "error": str(e)}, 500
+    finally:
+        done.set()
+
+    if result.get('success'):
+        job_queue.finish(job['id'], 'succeeded', result)
+    elif status >= 500 and job['attempts'] < JOB_MAX_ATTEMPTS:
+        # Back off so a HighLevel outage is not burned through in a few seconds
+        delay = min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (job['attempts'] - 1)) * random.uniform(0.8, 1.2)
+        print(f"Job {job['id']}: retryable failure ({status}), re-queueing in {delay:.0f}s")
+        job_queue.retry(job['id'], delay, result, result.get('error'))
+    else:
+        job_queue.finish(job['id'], 'failed', result, result.get('error'))
+
+
+def job_worker_loop():
+    while True:
+        try:
+            job = job_queue.claim()
+        except Exception as e:
+            print(f"Job queue error: {e}")
+            job = None
+
+        if job is None:
+            _job_wakeup.wait(JOB_POLL_INTERVAL)
+            _job_wakeup.clear()
+            continue
+
+        try:
+            run_job(job)
+        except Exception as e:
+            # Recording the outcome failed (e.g. database locked); the job's
+            # lease runs out and it is delivered again, the thread lives on
+            print(f"Job {job['id']}: error recording outcome: {e}")
+
+
+def start_job_workers(count=None):
+    """Start the background job threads for this process (once per process)"""
+    global _job_workers, _job_workers_pid
+    count = JOB_WORKERS if count is None else count
+    with _job_workers_lock:
+        if _job_workers_pid == os.getpid() or count <= 0:
+            return
+        _job_workers = [
+            threading.Thread(target=job_worker_loop, name=f'job-worker-{i}', daemon=True)
+            for i in range(count)
+        ]
+        for thread in _job_workers:
+            thread.start()
+        _job_workers_pid = os.getpid()
+        print(f"Started {count} background job workers")
+
+
+@app.before_request
+def ensure_job_workers():
+    start_job_workers()
+
+
+# Warm-up - render one QR (first-render cost: qrcode tables, PIL codecs)
+# and open keep-alive connections to HighLevel before taking traffic.
+# gunicorn runs it from post_fork; /health reports 503 until it is done
+WARMUP_HIGHLEVEL_CONNECTIONS = int(os.environ.get('WARMUP_HIGHLEVEL_CONNECTIONS', 2))
+WARMUP_QR_POOL = os.environ.get('WARMUP_QR_POOL', '0') == '1'
+
+_warmup_ready = threading.Event()
+_warmup_state = {'status': 'pending', 'errors': [], 'elapsed_ms': None}
+_warmup_lock = threading.Lock()
+_warmup_pid = None
+
+
+def prime_highlevel_connection():
+    """Open (and return to the pool) one keep-alive connection to HighLevel"""
+    client = get_highlevel_client()
+    client.session.head(
+        HIGHLEVEL_BASE_URL + '/',
+        timeout=(HIGHLEVEL_CONNECT_TIMEOUT, HIGHLEVEL_READ_TIMEOUT)
+    ).close()
+
+
+def warm_up():
+    """Pay the cold-start costs once; failures are recorded but never block readiness"""
+    started = time.monotonic()
+    errors = []
+
+    try:
+        render_qr_image('https://example.com/warm-up', 400, 4, 'png')
+        render_qr_image('https://example.com/warm-up', 400, 4, 'svg')
+    except Exception as e:
+        errors.append(f"qr: {e}")
+
+    if WARMUP_HIGHLEVEL_CONNECTIONS > 0:
+        # Concurrent, so each one takes its own pooled connection
+        futures = [get_highlevel_executor().submit(prime_highlevel_connection)
+                   for _ in range(WARMUP_HIGHLEVEL_CONNECTIONS)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"highlevel: {e}")
+
+    if WARMUP_QR_POOL:
+        try:
+            get_qr_pool().submit(render_qr_batch_item, 0, 'https://example.com/warm-up', 400, 4, 'png').result()
+        except Exception as e:
+            errors.append(f"qr pool: {e}")
+
+    elapsed_ms = round((time.monotonic() - started) * 1000)
+    _warmup_state.update(status='ready', errors=errors, elapsed_ms=elapsed_ms)
+    _warmup_ready.set()
+    print(f"Warm-up finished in {elapsed_ms}ms" + (f" with errors: {errors}" if errors else ""))
+
+
+def start_warmup():
+    """Run warm-up in the background for this process (once per process)"""
+    global _warmup_pid
+    with _warmup_lock:
+        if _warmup_pid == os.getpid():
+            return
+        _warmup_pid = os.getpid()
+        _warmup_ready.clear()
+        _warmup_state.update(status='warming', errors=[], elapsed_ms=None)
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+@app.before_request
+def ensure_warmup():
+    start_warmup()
+
+
+class SpoolingRequest(Request):
+    """Multipart file parts spool to disk past UPLOAD_SPOOL_BYTES (werkzeug's own threshold is 500 KB)"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, mode='rb+')
+
+
+app.request_class = SpoolingRequest
+
+
+def read_contact_update_request():
+    """Read a contact update from a JSON, multipart/form-data or raw image/png body
+
+    Multipart: form fields plus a "qr_image" file part. Raw image/png: the
+    fields go in the query string. Images are spooled to disk past a small
+    threshold, so memory stays flat. Returns (data, qr_file, error_response).
+    """
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return None, None, (jsonify({"error": f"Body larger than {MAX_UPLOAD_BYTES} bytes", "success": False}), 413)
+
+    if request.mimetype == 'multipart/form-data':
+        if request.content_length is None:
+            return None, None, (jsonify({"error": "Content-Length is required", "success": False}), 411)
+        data = request.form.to_dict()
+        upload = request.files.get('qr_image') or request.files.get('file')
+        return data, (upload.stream if upload else None), None
+
+    if request.mimetype == 'image/png':
+        qr_file = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+        received = 0
+        for chunk in iter(lambda: request.stream.read(64 * 1024), b''):
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES:
+                qr_file.close()
+                return None, None, (jsonify({"error": f"Body larger than {MAX_UPLOAD_BYTES} bytes", "success": False}), 413)
+            qr_file.write(chunk)
+        if not received:
+            qr_file.close()
+            return request.args.to_dict(), None, None
+        qr_file.seek(0)
+        return request.args.to_dict(), qr_file, None
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, None, (jsonify({"error": "Expected a JSON object body", "success": False}), 400)
+    return data, None, None
+
+
+def wants_async(data):
+    """Async mode: Prefer: respond-async header, ?async=1, or "async": true in the body"""
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        return True
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(data, dict) and data.get('async') is True
+
+
+@app.route('/update-highlevel-contact', methods=['POST'])
+def update_highlevel_contact():
+    """Update HighLevel contact with trigger URL, QR data, and neighbor info
+
+    In async mode the update is queued and 202 Accepted is returned with a
+    job id to poll at /jobs/<id>.
+    """
+    data, qr_file, error = read_contact_update_request()
+    if error:
+        return error
+
+    if wants_async(data):
+        if qr_file is not None:
+            return jsonify({"error": "async mode requires a JSON body", "success": False}), 400
+
+        payload = {key: value for key, value in data.items() if key != 'async'}
+        if not payload.get('contact_id') or not payload.get('trigger_url'):
+            return jsonify({"error": "contact_id and trigger_url are required", "success": False}), 400
+
+        job_id = job_queue.enqueue('update-highlevel-contact', payload)
+        _job_wakeup.set()
+        print(f"Queued contact update {payload['contact_id']} as job {job_id}")
+
+        response = jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}"
+        })
+        response.headers['Location'] = f"/jobs/{job_id}"
+        return response, 202
+
+    try:
+        result, status = process_contact_update(data, qr_file)
+    finally:
+        if qr_file is not None:
+            qr_file.close()
+    return jsonify(result), status
+
+
+@app.route('/update-highlevel-contacts/batch', methods=['POST'])
+def update_highlevel_contacts_batch():
+    """Update many contacts with bounded fan-out, streaming NDJSON as each finishes
+
+    Body: {"contacts": [<update-highlevel-contact payload>, ...], "concurrency": 8}
+    or a bare list. Each output line carries the item's "index".
+    """
+    data = request.get_json(silent=True)
+    contacts = data.get('contacts') if isinstance(data, dict) else data
+
+    if not isinstance(contacts, list) or not contacts:
+        return jsonify({"error": "contacts must be a non-empty list", "success": False}), 400
+
+    if len(contacts) > HIGHLEVEL_BATCH_MAX_ITEMS:
+        return jsonify({
+            "error": f"Too many contacts ({len(contacts)}), max is {HIGHLEVEL_BATCH_MAX_ITEMS}",
+            "success": False
+        }), 413
+
+    concurrency = HIGHLEVEL_BATCH_CONCURRENCY
+    if isinstance(data, dict) and data.get('concurrency') is not None:
+        try:
+            concurrency = int(data['concurrency'])
+        except (TypeError, ValueError):
+            return jsonify({"error": "concurrency must be an integer", "success": False}), 400
+    concurrency = max(1, min(concurrency, HIGHLEVEL_BATCH_MAX_CONCURRENCY))
+
+    print(f"Contact batch: {len(contacts)} contacts, concurrency {concurrency}")
+
+    def stream():
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='contact-batch')
+        futures = {executor.submit(batch_contact_update, contact): index for index, contact in enumerate(contacts)}
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                result["index"] = futures[future]
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client went away - drop whatever hasn't started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "success": False}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List recent jobs, optionally filtered: /jobs?status=queued&limit=100"""
+    status = request.args.get('status')
+    if status and status not in JOB_STATUSES:
+        return jsonify({"error": f"status must be one of: {', '.join(JOB_STATUSES)}", "success": False}), 400
+
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify({
+        "jobs": job_queue.list(status, limit),
+        "counts": job_queue.counts()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: per-stage latency histograms, in-flight gauges, cache hit ratios"""
+    return metrics_response()
+
+
+@app.route('/admin/upstream-cache', methods=['GET'])
+def list_upstream_cache():
+    """Inspect the trigger link / media index: ?kind=link|media&limit=100"""
+    kind = request.args.get('kind')
+    if kind and kind not in UPSTREAM_INDEX_TTLS:
+        return jsonify({"error": f"kind must be one of: {', '.join(UPSTREAM_INDEX_TTLS)}", "success": False}), 400
+
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify({
+        "entries": upstream_index.list(kind, limit),
+        "counts": upstream_index.counts(),
+        "ttls": UPSTREAM_INDEX_TTLS
+    })
+
+
+@app.route('/admin/upstream-cache', methods=['DELETE'])
+def purge_upstream_cache():
+    """Purge index entries: everything, or narrowed by ?kind=, ?key= and ?expired=1"""
+    kind = request.args.get('kind')
+    if kind and kind not in UPSTREAM_INDEX_TTLS:
+        return jsonify({"error": f"kind must be one of: {', '.join(UPSTREAM_INDEX_TTLS)}", "success": False}), 400
+
+    expired_only = request.args.get('expired', '').lower() in ('1', 'true', 'yes')
+    purged = upstream_index.purge(kind, request.args.get('key'), expired_only)
+    print(f"Purged {purged} upstream index entries")
+    return jsonify({"success": True, "purged": purged})
 
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        # Dedicated job processor: python app.py worker
+        start_job_workers(max(1, JOB_WORKERS))
+        while True:
+            time.sleep(3600)
+
+    start_job_workers()
+    start_warmup()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,83 @@
+"""Diff two benchmark result files from bench/run.py
+
+    python bench/compare.py bench/results/old.json bench/results/new.json --threshold 10
+
+Prints every load and micro-benchmark metric side by side with the change
+in percent, and exits 1 when any of them got worse by more than
+--threshold percent (latency up, throughput down), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+# Metric -> True when bigger is better
+LOAD_METRICS = {'rps': True, 'p50_ms': False, 'p95_ms': False, 'p99_ms': False, 'errors': False}
+MICRO_METRICS = {'median_us': False, 'p95_us': False}
+
+
+def load_rows(results):
+    rows = {}
+    for scenario, levels in results.get('load', {}).items():
+        for level in levels:
+            for metric in LOAD_METRICS:
+                rows[(f"{scenario} c={level['concurrency']}", metric)] = level.get(metric)
+    for case in results.get('qr_microbench', []):
+        name = f"qr size={case['size']} url={case['url_length']}"
+        for stage, timings in case['stages'].items():
+            for metric in MICRO_METRICS:
+                rows[(f"{name} {stage}", metric)] = timings.get(metric)
+    return rows
+
+
+def compare(old, new, threshold):
+    """(rows, regressions) where each row is (name, metric, old, new, change %)"""
+    old_rows, new_rows = load_rows(old), load_rows(new)
+    rows, regressions = [], []
+    for key in sorted(old_rows.keys() & new_rows.keys()):
+        name, metric = key
+        before, after = old_rows[key], new_rows[key]
+        if before is None or after is None:
+            continue
+        higher_is_better = {**LOAD_METRICS, **MICRO_METRICS}[metric]
+        if metric == 'errors':
+            change = None
+            worse = after > before
+        else:
+            change = (after - before) / before * 100 if before else None
+            worse = change is not None and (-change if higher_is_better else change) > threshold
+        rows.append((name, metric, before, after, change))
+        if worse:
+            regressions.append((name, metric, before, after, change))
+    return rows, regressions
+
+
+def format_row(row):
+    name, metric, before, after, change = row
+    delta = f"{change:+.1f}%" if change is not None else ''
+    return f"{name:44} {metric:10} {before:>12} {after:>12} {delta:>9}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10, help='Allowed slowdown in percent')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"old: {old.get('meta', {}).get('version')} ({old.get('meta', {}).get('commit')})  "
+          f"new: {new.get('meta', {}).get('version')} ({new.get('meta', {}).get('commit')})")
+    rows, regressions = compare(old, new, args.threshold)
+    for row in rows:
+        print(format_row(row))
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:g}%:")
+        for row in regressions:
+            print(format_row(row))
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:g}%")
@@ -0,0 +1,172 @@
+"""Fixed-concurrency load test for a running worker
+
+Each scenario runs once per concurrency level: N client threads send
+requests back to back for --duration seconds (after a short warm-up), and
+latency percentiles, throughput and errors are reported:
+
+    python bench/load_test.py --target http://127.0.0.1:5000 --scenario generate-qr --concurrency 1,8,32
+
+Scenarios:
+    generate-qr                      unique URL per request (render path)
+    generate-qr-cached               one URL (QR cache path)
+    update-highlevel-contact         trigger link + media upload + contact PUT
+    update-highlevel-contact-render  same, with the QR rendered by the worker ("qr": true)
+
+For the contact scenarios the worker should talk to bench/mock_highlevel.py
+and have UPSTREAM_LINK_TTL=0 UPSTREAM_MEDIA_TTL=0, otherwise repeats are
+answered from the upstream index and skip HighLevel (bench/run.py does this).
+"""
+import argparse
+import base64
+import io
+import itertools
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SCENARIOS = ('generate-qr', 'generate-qr-cached', 'update-highlevel-contact', 'update-highlevel-contact-render')
+
+_counter = itertools.count()
+_qr_png_base64 = None
+
+
+def sample_qr_png_base64():
+    """A real 400px QR PNG, rendered once, for the contact upload payloads"""
+    global _qr_png_base64
+    if _qr_png_base64 is None:
+        import qrcode
+
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, border=4)
+        qr.add_data('https://example.com/bench/trigger')
+        qr.make(fit=True)
+        buffer = io.BytesIO()
+        qr.make_image().resize((400, 400)).save(buffer, format='PNG')
+        _qr_png_base64 = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return _qr_png_base64
+
+
+def build_request(scenario):
+    """(method, path, json body) for the next request of a scenario"""
+    n = next(_counter)
+    if scenario == 'generate-qr':
+        return 'POST', '/generate-qr', {'url': f"https://example.com/listing/{n}?campaign=bench", 'size': 400}
+    if scenario == 'generate-qr-cached':
+        return 'POST', '/generate-qr', {'url': 'https://example.com/listing/cached', 'size': 400}
+    if scenario == 'update-highlevel-contact':
+        return 'POST', '/update-highlevel-contact', {
+            'contact_id': f"bench-{n}",
+            'trigger_url': f"https://example.com/t/{n}",
+            'qr_image': sample_qr_png_base64()
+        }
+    if scenario == 'update-highlevel-contact-render':
+        return 'POST', '/update-highlevel-contact', {
+            'contact_id': f"bench-{n}",
+            'trigger_url': f"https://example.com/t/{n}",
+            'qr': {'size': 400}
+        }
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'ok': ok,
+        'errors': len(latencies) - ok,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+        'mean_ms': ms(sum(latencies) / len(latencies) if latencies else None),
+        'elapsed_s': round(elapsed, 3)
+    }
+
+
+def run_level(target, scenario, concurrency, duration, warmup=1.0, timeout=60):
+    """Run one scenario at one concurrency level and return its summary"""
+    stop_at = time.monotonic() + warmup + duration
+    measure_from = time.monotonic() + warmup
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def client():
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        while True:
+            method, path, body = build_request(scenario)
+            started = time.monotonic()
+            if started >= stop_at:
+                break
+            try:
+                status = session.request(method, target + path, json=body, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            finished = time.monotonic()
+            if started >= measure_from:
+                with lock:
+                    latencies.append(finished - started)
+                    statuses[status] = statuses.get(status, 0) + 1
+        session.close()
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests still running at stop_at finish late; measure to the last one
+    elapsed = max(duration, time.monotonic() - measure_from)
+
+    summary = summarize(latencies, statuses, elapsed)
+    summary['concurrency'] = concurrency
+    return summary
+
+
+def run_scenarios(target, scenarios, levels, duration, warmup=1.0):
+    results = {}
+    for scenario in scenarios:
+        results[scenario] = []
+        for concurrency in levels:
+            summary = run_level(target, scenario, concurrency, duration, warmup)
+            results[scenario].append(summary)
+            print(f"{scenario:34} c={concurrency:<4} {summary['rps']:>9} rps  "
+                  f"p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  p99 {summary['p99_ms']}ms  "
+                  f"errors {summary['errors']}")
+    return results
+
+
+def parse_levels(value):
+    return [int(level) for level in value.split(',') if level.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--target', default='http://127.0.0.1:5000')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='Repeatable; default: generate-qr and update-highlevel-contact')
+    parser.add_argument('--concurrency', type=parse_levels, default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=10, help='Measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=1, help='Unmeasured seconds before each level')
+    parser.add_argument('--output', help='Write the results as JSON here')
+    args = parser.parse_args()
+
+    scenarios = args.scenario or ['generate-qr', 'update-highlevel-contact']
+    results = run_scenarios(args.target.rstrip('/'), scenarios, args.concurrency, args.duration, args.warmup)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'load': results}, f, indent=2)
+        print(f"Wrote {args.output}")
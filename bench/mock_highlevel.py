@@ -0,0 +1,230 @@
+"""Local stand-in for the HighLevel API, so the worker can be benchmarked offline
+
+Implements the three calls app.py makes - POST /links/, POST
+/medias/upload-file and PUT /contacts/{id} - with configurable latency,
+error rate and 429 behaviour:
+
+    python bench/mock_highlevel.py --port 8089 --latency-ms 80 --jitter-ms 20 --error-rate 0.01 --rate-limit 50
+
+Point the worker at it with HIGHLEVEL_BASE_URL=http://127.0.0.1:8089.
+GET /_stats returns request counts by route and status.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTACT_PATH = re.compile(r'^/contacts/([^/?]+)/?$')
+
+
+class MockConfig:
+    def __init__(self, latency_ms=50, jitter_ms=0, upload_latency_ms=0, error_rate=0.0,
+                 throttle_rate=0.0, rate_limit=0.0, retry_after=1.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.upload_latency_ms = upload_latency_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+    def to_dict(self):
+        return {key: value for key, value in vars(self).items() if key != 'random'}
+
+
+class MockState:
+    """Token bucket for --rate-limit plus request counters, shared by all handler threads"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.tokens = config.rate_limit
+        self.updated = time.monotonic()
+        self.counts = {}
+
+    def allow(self):
+        """False when this request should get a 429"""
+        config = self.config
+        with self.lock:
+            if config.throttle_rate and config.random.random() < config.throttle_rate:
+                return False
+            if not config.rate_limit:
+                return True
+            now = time.monotonic()
+            self.tokens = min(config.rate_limit, self.tokens + (now - self.updated) * config.rate_limit)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def roll_error(self):
+        with self.lock:
+            return self.config.error_rate and self.config.random.random() < self.config.error_rate
+
+    def delay(self, route):
+        config = self.config
+        with self.lock:
+            jitter = config.random.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0
+        extra = config.upload_latency_ms if route == 'medias' else 0
+        return max(0.0, config.latency_ms + jitter + extra) / 1000
+
+    def record(self, route, status):
+        with self.lock:
+            key = f"{route} {status}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {'config': self.config.to_dict(), 'requests': dict(self.counts)}
+
+
+class MockHighLevelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    # Headers and body go out in separate writes; with Nagle on, every call on
+    # a reused connection would stall ~40ms waiting on the client's delayed ACK
+    disable_nagle_algorithm = True
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().strip() or b'0', 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                body.extend(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, route, respond):
+        body = self._read_body()
+        state = self.state
+        time.sleep(state.delay(route))
+        if not state.allow():
+            state.record(route, 429)
+            self._send(429, {'message': 'Too many requests'}, {'Retry-After': f"{state.config.retry_after:g}"})
+        elif state.roll_error():
+            state.record(route, 500)
+            self._send(500, {'message': 'Internal server error (injected)'})
+        else:
+            status, payload = respond(body)
+            state.record(route, status)
+            self._send(status, payload)
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        if path in ('/links/', '/links'):
+            self._handle('links', self._create_link)
+        elif path == '/medias/upload-file':
+            self._handle('medias', self._upload_media)
+        else:
+            self._read_body()
+            self._send(404, {'message': f"No route for POST {path}"})
+
+    def do_PUT(self):
+        match = CONTACT_PATH.match(self.path.split('?', 1)[0])
+        if match:
+            contact_id = match.group(1)
+            self._handle('contacts', lambda body: (200, {'contact': {'id': contact_id}}))
+        else:
+            self._read_body()
+            self._send(404, {'message': f"No route for PUT {self.path}"})
+
+    def do_HEAD(self):
+        # The worker's warm-up opens connections with HEAD /
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/_stats':
+            self._send(200, self.state.stats())
+        else:
+            self._send(404, {'message': f"No route for GET {self.path}"})
+
+    def _create_link(self, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 422, {'message': 'Invalid JSON'}
+        link_id = uuid.uuid4().hex[:20]
+        return 201, {'link': {
+            'id': link_id,
+            'name': data.get('name'),
+            'redirectTo': data.get('redirectTo'),
+            'locationId': data.get('locationId'),
+            'fieldKey': f"{{{{trigger_link.{link_id}}}}}"
+        }}
+
+    def _upload_media(self, body):
+        file_id = uuid.uuid4().hex[:20]
+        return 201, {'fileId': file_id, 'url': f"https://mock-highlevel.local/medias/{file_id}.png", 'bytes': len(body)}
+
+
+def make_server(config, host='127.0.0.1', port=0):
+    """A ready-to-serve mock; port 0 picks a free port (see server.server_port)"""
+    handler = type('Handler', (MockHighLevelHandler,), {'state': MockState(config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(config, host='127.0.0.1', port=0):
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, name='mock-highlevel', daemon=True).start()
+    return server
+
+
+def add_arguments(parser, prefix=''):
+    parser.add_argument(f'--{prefix}latency-ms', type=float, default=50, help='Base latency per call')
+    parser.add_argument(f'--{prefix}jitter-ms', type=float, default=0, help='Uniform +/- jitter on the latency')
+    parser.add_argument(f'--{prefix}upload-latency-ms', type=float, default=0, help='Extra latency for media uploads')
+    parser.add_argument(f'--{prefix}error-rate', type=float, default=0.0, help='Share of calls answered with 500')
+    parser.add_argument(f'--{prefix}throttle-rate', type=float, default=0.0, help='Share of calls answered with 429')
+    parser.add_argument(f'--{prefix}rate-limit', type=float, default=0.0, help='Calls/second before 429s (0 = off)')
+    parser.add_argument(f'--{prefix}retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    parser.add_argument(f'--{prefix}seed', type=int, default=None, help='Seed for reproducible error/429 injection')
+
+
+def config_from_args(args, prefix=''):
+    prefix = prefix.replace('-', '_')
+    return MockConfig(**{
+        name: getattr(args, prefix + name)
+        for name in ('latency_ms', 'jitter_ms', 'upload_latency_ms', 'error_rate',
+                     'throttle_rate', 'rate_limit', 'retry_after', 'seed')
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(config_from_args(args), args.host, args.port)
+    print(f"Mock HighLevel listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,124 @@
+"""In-process QR rendering micro-benchmarks
+
+Times qr_render.py's rendering stages (matrix, rasterize, PNG encode, SVG,
+base64) directly, without HTTP or the QR cache, for a grid of image sizes
+and URL lengths:
+
+    python bench/qr_microbench.py --sizes 100,400,1000 --url-lengths 30,120,400 --repeat 50
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = [100, 400, 1000]
+DEFAULT_URL_LENGTHS = [30, 120, 400]
+
+
+def import_qr_render():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import qr_render
+
+    return qr_render
+
+
+def sample_url(length):
+    """A deterministic https URL of exactly length characters"""
+    base = 'https://example.com/l/'
+    filler = ('abcdefghijklmnopqrstuvwxyz0123456789' * (length // 36 + 1))
+    return (base + filler)[:max(length, len(base))]
+
+
+def measure(func, repeat):
+    """Run func repeat times; (timings in seconds, last return value)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def timing_summary(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return {
+        'median_us': round(statistics.median(timings) * 1e6, 1),
+        'p95_us': round(p95 * 1e6, 1),
+        'min_us': round(timings[0] * 1e6, 1)
+    }
+
+
+def bench_case(qr_render, size, url_length, repeat):
+    url = sample_url(url_length)
+    matrix_timings, matrix = measure(lambda: qr_render.build_qr_matrix(url), repeat)
+    raster_timings, image = measure(lambda: qr_render.rasterize_qr_matrix(matrix, size), repeat)
+
+    def encode_png():
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    png_timings, png = measure(encode_png, repeat)
+    svg_timings, svg = measure(lambda: qr_render.qr_matrix_to_svg(matrix, size), repeat)
+    base64_timings, _ = measure(lambda: base64.b64encode(png), repeat)
+    render_timings, _ = measure(lambda: qr_render.render_qr_image(url, size, image_format='png'), repeat)
+
+    return {
+        'size': size,
+        'url_length': url_length,
+        'modules': len(matrix),
+        'png_bytes': len(png),
+        'svg_bytes': len(svg),
+        'stages': {
+            'matrix': timing_summary(matrix_timings),
+            'rasterize': timing_summary(raster_timings),
+            'encode_png': timing_summary(png_timings),
+            'svg': timing_summary(svg_timings),
+            'base64': timing_summary(base64_timings),
+            'render_png': timing_summary(render_timings)
+        }
+    }
+
+
+def run_microbench(sizes=None, url_lengths=None, repeat=30):
+    qr_render = import_qr_render()
+    results = []
+    for url_length in url_lengths or DEFAULT_URL_LENGTHS:
+        for size in sizes or DEFAULT_SIZES:
+            case = bench_case(qr_render, size, url_length, repeat)
+            results.append(case)
+            stages = case['stages']
+            print(f"size={size:<5} url={url_length:<4} modules={case['modules']:<4} "
+                  f"render_png {stages['render_png']['median_us']}us "
+                  f"(matrix {stages['matrix']['median_us']}, rasterize {stages['rasterize']['median_us']}, "
+                  f"encode {stages['encode_png']['median_us']})  svg {stages['svg']['median_us']}us  "
+                  f"png {case['png_bytes']}B")
+    return results
+
+
+def parse_ints(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=parse_ints, default=DEFAULT_SIZES)
+    parser.add_argument('--url-lengths', type=parse_ints, default=DEFAULT_URL_LENGTHS)
+    parser.add_argument('--repeat', type=int, default=30, help='Timed runs per stage and case')
+    parser.add_argument('--output', help='Write the results as JSON here')
+    args = parser.parse_args()
+
+    results = run_microbench(args.sizes, args.url_lengths, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'qr_microbench': results}, f, indent=2)
+        print(f"Wrote {args.output}")
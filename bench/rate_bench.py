@@ -0,0 +1,130 @@
+"""Shared HighLevel rate limiter contention benchmark
+
+Forks --processes processes of --threads threads that all draw --tokens
+tokens each from one SharedTokenBucket in a temporary database, and reports
+the achieved rate, the SQLite write transactions it took and the acquire
+latency. --batch 1 --per-call takes one token per transaction from every
+thread, the way the limiter worked before batching:
+
+    python bench/rate_bench.py --rate 1000 --processes 4 --threads 16 --tokens 100 --batch 5
+    python bench/rate_bench.py --rate 1000 --processes 4 --threads 16 --tokens 100 --batch 1 --per-call
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_app(db_path):
+    os.environ['WORKER_DB_PATH'] = db_path
+    os.environ['JOB_WORKERS'] = '0'
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app
+
+    return app
+
+
+def per_call_acquire(store, key, rate, capacity):
+    while True:
+        taken, wait = store.take(key, rate, capacity, 1)
+        if taken:
+            return
+        time.sleep(wait)
+
+
+def run_process(args, db_path, results):
+    app = import_app(db_path)
+    store = app.RateBuckets(db_path)
+    transactions = [0]
+    take = store.take
+
+    def counted_take(*take_args):
+        transactions[0] += 1
+        return take(*take_args)
+
+    store.take = counted_take
+    bucket = app.SharedTokenBucket(store, 'bench:rate', args.rate, args.burst, args.batch)
+    latencies = []
+    errors = [0]
+
+    def worker():
+        for _ in range(args.tokens):
+            started = time.perf_counter()
+            try:
+                if args.per_call:
+                    per_call_acquire(store, bucket.key, bucket.rate, bucket.capacity)
+                else:
+                    bucket.acquire()
+            except Exception:
+                errors[0] += 1
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((transactions[0], errors[0], latencies))
+
+
+def run_bench(args):
+    workdir = tempfile.mkdtemp(prefix='rate-bench-')
+    db_path = os.path.join(workdir, 'worker.sqlite3')
+    try:
+        import_app(db_path)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        started = time.perf_counter()
+        processes = [context.Process(target=run_process, args=(args, db_path, results)) for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[2])
+    count = len(latencies)
+    return {
+        'tokens': count,
+        'elapsed_s': round(elapsed, 3),
+        'tokens_per_s': round(count / elapsed, 1),
+        'transactions': sum(outcome[0] for outcome in outcomes),
+        'errors': sum(outcome[1] for outcome in outcomes),
+        'p50_ms': round(latencies[count // 2] * 1e3, 2),
+        'p99_ms': round(latencies[min(count - 1, int(count * 0.99))] * 1e3, 2)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rate', type=float, default=10)
+    parser.add_argument('--burst', type=float, help='Default: --rate')
+    parser.add_argument('--batch', type=int, default=5, help='Tokens reserved per transaction')
+    parser.add_argument('--per-call', action='store_true', help='Every thread takes one token per transaction')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='Threads per process')
+    parser.add_argument('--tokens', type=int, default=5, help='Tokens per thread')
+    parser.add_argument('--output', help='Write the results as JSON here')
+    args = parser.parse_args()
+    args.burst = args.burst or args.rate
+
+    result = run_bench(args)
+    print(f"rate={args.rate:g} batch={args.batch} per_call={args.per_call} "
+          f"{args.processes}x{args.threads}: {result['tokens']} tokens in {result['elapsed_s']}s "
+          f"({result['tokens_per_s']}/s), {result['transactions']} transactions, {result['errors']} errors, "
+          f"p50 {result['p50_ms']}ms p99 {result['p99_ms']}ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'rate_bench': result}, f, indent=2)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,200 @@
+"""Run the whole benchmark suite against a local worker and mock HighLevel
+
+Starts bench/mock_highlevel.py in-process, boots the worker pointed at it
+(gunicorn with gunicorn.conf.py by default, or the Flask dev server with
+--server flask), waits for /health, runs the load scenarios and the QR
+micro-benchmarks, and writes everything to one JSON file:
+
+    python bench/run.py --concurrency 1,8,32 --duration 10 --latency-ms 80 --output bench/results/7.22.json
+    python bench/compare.py bench/results/7.21.json bench/results/7.22.json
+
+The worker gets its own temporary job database and metrics directory,
+plus UPSTREAM_LINK_TTL=0 UPSTREAM_MEDIA_TTL=0 so every contact
+update makes all three HighLevel calls. Its HighLevel rate limit is raised
+out of the way (HIGHLEVEL_RATE_PER_SECOND=1000) so the numbers measure the
+worker, not the limiter; override with --worker-env NAME=VALUE.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import load_test
+import mock_highlevel
+import qr_microbench
+
+DEFAULT_WORKER_ENV = {
+    'UPSTREAM_LINK_TTL': '0',
+    'UPSTREAM_MEDIA_TTL': '0',
+    'HIGHLEVEL_RATE_PER_SECOND': '1000',
+    'HIGHLEVEL_RATE_BURST': '1000',
+    'HIGHLEVEL_TOKEN': 'bench-token',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def app_version():
+    """VERSION from app.py, read without importing the app"""
+    with open(os.path.join(ROOT, 'app.py')) as f:
+        match = re.search(r'^VERSION = "([^"]+)"', f.read(), re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_worker(server, port, env, log_file):
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+    else:
+        command = [sys.executable, 'app.py']
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_for_health(target, process, timeout=60):
+    """The worker's /health body once it reports ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Worker exited with status {process.returncode} before becoming ready")
+        try:
+            response = requests.get(f"{target}/health", timeout=2)
+            if response.status_code == 200:
+                return response.json()
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Worker not ready after {timeout}s")
+
+
+def stop_worker(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def parse_env(values):
+    env = {}
+    for value in values or []:
+        name, sep, setting = value.partition('=')
+        if not sep:
+            raise SystemExit(f"--worker-env expects NAME=VALUE, got {value!r}")
+        env[name] = setting
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--server', choices=('gunicorn', 'flask'), default='gunicorn')
+    parser.add_argument('--workers', type=int, help='GUNICORN_WORKERS for the worker (default: cpu count)')
+    parser.add_argument('--scenario', action='append', choices=load_test.SCENARIOS,
+                        help='Repeatable; default: generate-qr and update-highlevel-contact')
+    parser.add_argument('--concurrency', type=load_test.parse_levels, default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=10, help='Measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=1, help='Unmeasured seconds before each level')
+    parser.add_argument('--sizes', type=qr_microbench.parse_ints, default=qr_microbench.DEFAULT_SIZES)
+    parser.add_argument('--url-lengths', type=qr_microbench.parse_ints, default=qr_microbench.DEFAULT_URL_LENGTHS)
+    parser.add_argument('--repeat', type=int, default=30, help='Micro-benchmark runs per stage and case')
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--skip-microbench', action='store_true')
+    parser.add_argument('--worker-env', action='append', metavar='NAME=VALUE', help='Extra worker environment')
+    parser.add_argument('--output', help='Results file (default: bench/results/<version>-<commit>-<time>.json)')
+    mock_highlevel.add_arguments(parser)
+    args = parser.parse_args()
+
+    mock_config = mock_highlevel.config_from_args(args)
+    scenarios = args.scenario or ['generate-qr', 'update-highlevel-contact']
+    results = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'server': args.server,
+            'scenarios': scenarios,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mock': mock_config.to_dict(),
+        }
+    }
+
+    if not args.skip_load:
+        mock = mock_highlevel.start_in_thread(mock_config)
+        workdir = tempfile.mkdtemp(prefix='worker-bench-')
+        port = free_port()
+        target = f"http://127.0.0.1:{port}"
+        worker_env = dict(DEFAULT_WORKER_ENV, **parse_env(args.worker_env))
+        if args.workers:
+            worker_env['GUNICORN_WORKERS'] = str(args.workers)
+        env = dict(os.environ, **worker_env)
+        env.update({
+            'PORT': str(port),
+            'HIGHLEVEL_BASE_URL': f"http://127.0.0.1:{mock.server_port}",
+            'WORKER_DB_PATH': os.path.join(workdir, 'worker.sqlite3'),
+            'PROMETHEUS_MULTIPROC_DIR': os.path.join(workdir, 'metrics'),
+        })
+        os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+        results['config']['worker_env'] = worker_env
+
+        log_path = os.path.join(workdir, 'worker.log')
+        print(f"Starting worker ({args.server}) on {target}, log: {log_path}")
+        with open(log_path, 'w') as log_file:
+            process = start_worker(args.server, port, env, log_file)
+            try:
+                health = wait_for_health(target, process)
+                results['meta']['version'] = health.get('version')
+                results['load'] = load_test.run_scenarios(target, scenarios, args.concurrency, args.duration, args.warmup)
+                results['mock_stats'] = requests.get(f"http://127.0.0.1:{mock.server_port}/_stats", timeout=5).json()['requests']
+            finally:
+                stop_worker(process)
+                mock.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if not args.skip_microbench:
+        results['qr_microbench'] = qr_microbench.run_microbench(args.sizes, args.url_lengths, args.repeat)
+        results['meta'].setdefault('version', app_version())
+
+    output = args.output
+    if not output:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(BENCH_DIR, 'results', f"{results['meta'].get('version')}-{results['meta']['commit']}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# Production server config: gunicorn -c gunicorn.conf.py app:app
+#
+# One process per core, each with a pool of threads - most of a request's
+# time is spent waiting on HighLevel, and QR rendering goes to the batch
+# process pool. The app is imported once in the master (preload_app) so the
+# forked workers share the loaded modules copy-on-write; each worker then
+# starts its job threads and warm-up in post_fork.
+import multiprocessing
+import os
+
+# Every process writes its metrics here and /metrics aggregates them; set
+# before the app (and prometheus_client) is imported
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus-multiproc')
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+# The app sizes its per-process QR render pool from this
+os.environ['GUNICORN_WORKERS'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    # Counters from a previous run must not be carried over
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so they are started per worker here
+    import app
+
+    app.start_job_workers()
+    app.start_warmup()
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges (in-flight counts) from /metrics
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,128 @@
+"""Prometheus metrics shared by the QR/HighLevel worker (app.py) and the scraper (old_app.py)
+
+Per-stage latency histograms, upstream call outcomes, in-flight gauges and
+cache lookups. Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set by
+gunicorn.conf.py) makes every process - web workers and the QR batch pool -
+write its samples there, and /metrics aggregates them all.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+UPSTREAM_BUCKETS = (.025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+SCRAPE_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+QR_STAGE_SECONDS = Histogram(
+    'qr_stage_seconds', 'Time spent in each QR rendering stage (make, rasterize, encode, svg, base64)',
+    ['stage'], buckets=FAST_BUCKETS
+)
+HIGHLEVEL_REQUEST_SECONDS = Histogram(
+    'highlevel_request_seconds', 'HighLevel API call latency per attempt, by endpoint and upstream status',
+    ['endpoint', 'status'], buckets=UPSTREAM_BUCKETS
+)
+SCRAPE_STAGE_SECONDS = Histogram(
+    'scrape_stage_seconds', 'Time spent in each scraper stage (launch, goto, extract, screenshot, photos)',
+    ['stage'], buckets=SCRAPE_BUCKETS
+)
+SCRAPE_ATTEMPTS = Counter('scrape_attempts_total', 'Scrape attempts by outcome', ['outcome'])
+SCRAPES_IN_FLIGHT = Gauge('scrapes_in_flight', 'Scrapes holding a concurrency slot', multiprocess_mode='livesum')
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_seconds', 'Request handling time by endpoint (streamed bodies: until the first byte)',
+    ['service', 'endpoint', 'method', 'status'], buckets=UPSTREAM_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled', ['service', 'endpoint'],
+    multiprocess_mode='livesum'
+)
+# result: hit, disk_hit or stale (all served from cache) or miss
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
+CACHE_HIT_RESULTS = ('hit', 'disk_hit', 'stale')
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the duration of the with-block on histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def count_cache(cache, result):
+    CACHE_REQUESTS.labels(cache=cache, result=result).inc()
+
+
+class CacheHitRatioCollector:
+    """cache_hit_ratio gauges computed from the (aggregated) cache_requests_total counters"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def collect(self):
+        totals, hits = {}, {}
+        for family in self.source.collect():
+            if family.name != 'cache_requests':
+                continue
+            for sample in family.samples:
+                if not sample.name.endswith('_total'):
+                    continue
+                cache = sample.labels['cache']
+                totals[cache] = totals.get(cache, 0) + sample.value
+                if sample.labels['result'] in CACHE_HIT_RESULTS:
+                    hits[cache] = hits.get(cache, 0) + sample.value
+
+        ratio = GaugeMetricFamily('cache_hit_ratio', 'Share of cache lookups served from cache', labels=['cache'])
+        for cache, total in totals.items():
+            if total:
+                ratio.add_metric([cache], hits.get(cache, 0) / total)
+        yield ratio
+
+
+if not MULTIPROCESS:
+    REGISTRY.register(CacheHitRatioCollector(CACHE_REQUESTS))
+
+
+def metrics_response():
+    """Flask response with every metric in Prometheus text format"""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(CacheHitRatioCollector(multiprocess.MultiProcessCollector(None)))
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def instrument_app(app, service):
+    """Record latency and in-flight counts for every request to app"""
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.labels(service=service, endpoint=g.metrics_endpoint).inc()
+
+    @app.after_request
+    def _metrics_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(error=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = g.pop('metrics_endpoint')
+        status = g.pop('metrics_status', 500)
+        HTTP_IN_FLIGHT.labels(service=service, endpoint=endpoint).dec()
+        HTTP_REQUEST_SECONDS.labels(
+            service=service, endpoint=endpoint, method=request.method, status=str(status)
+        ).observe(time.perf_counter() - started)
@@ -1,22 +1,36 @@
 import os
-from flask import Flask, request, jsonify
-from playwright.async_api import async_playwright
+import io
+import re
+import json
+import sqlite3
+import tempfile
+from flask import Flask, Response, request, jsonify, send_from_directory
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 import asyncio
 import hashlib
 import time
+import random
 import base64
-import os
+import queue
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from PIL import Image
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import (
+    SCRAPE_STAGE_SECONDS, SCRAPE_ATTEMPTS, SCRAPES_IN_FLIGHT, timed, count_cache, instrument_app, metrics_response
+)
 
 app = Flask(__name__)
+instrument_app(app, 'scraper')
 
 # Version
 VERSION = "7.19-fix-country-us"
 print(f"=== STARTING WORKER VERSION {VERSION} ===")
 
-# Session cache - cleared at start of each /scrape request
-# Can be used within same request for retries
-session_cache = {}
-
 # Bright Data Web Unlocker proxy configuration
 PROXY_HOST = "brd.superproxy.io"
 PROXY_PORT = 33335
@@ -32,156 +46,536 @@ def get_proxy_user():
     return f"{PROXY_USER_BASE}-country-us-session-{session_id}"
 
 
-def clear_session():
-    """Clear all cached data - called at START of each request"""
-    global session_cache
-    session_cache = {}
-    print("🧹 SESSION CLEARED - Starting fresh")
+# Browser pool - Chromium is launched once per worker and reused; every
+# scrape still gets its own fresh context (own proxy session, no cookies,
+# no cache), and browsers are recycled after BROWSER_MAX_CONTEXTS contexts
+# or when the browser processes grow past BROWSER_MAX_RSS_MB
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_CONTEXTS = int(os.environ.get('BROWSER_MAX_CONTEXTS', 50))
+BROWSER_MAX_RSS_MB = int(os.environ.get('BROWSER_MAX_RSS_MB', 1500))
+BROWSER_HEALTHCHECK_INTERVAL = float(os.environ.get('BROWSER_HEALTHCHECK_INTERVAL', 30))
+BROWSER_LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+
+
+def browser_tree_rss_mb():
+    """Resident memory (MB) of every process below this one - the Playwright
+    driver and its Chromium processes. None where /proc isn't available."""
+    try:
+        children = {}
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    # comm may contain spaces, so split after its closing paren
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(pid))
+
+        total_pages = 0
+        pending = list(children.get(os.getpid(), []))
+        while pending:
+            pid = pending.pop()
+            pending.extend(children.get(pid, []))
+            try:
+                with open(f'/proc/{pid}/statm') as f:
+                    total_pages += int(f.read().split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+        return total_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+class BrowserSlot:
+    def __init__(self, browser):
+        self.browser = browser
+        self.active = 0
+        self.served = 0
+        self.retiring = False
+        self.launched_at = time.time()
+
+
+class BrowserPool:
+    """Pre-launched Chromium browsers shared by concurrent scrapes"""
+
+    def __init__(self, size, max_contexts, max_rss_mb):
+        self.size = max(1, size)
+        self.max_contexts = max_contexts
+        self.max_rss_mb = max_rss_mb
+        self.playwright = None
+        self.slots = []
+        self.launches = 0
+        self.recycled = 0
+        self._launching = 0
+        self._lock = None
+        self._playwright_lock = None
+        self._healthcheck_task = None
+        self._maintenance_tasks = set()
+
+    async def start(self):
+        self._lock = asyncio.Lock()
+        self._playwright_lock = asyncio.Lock()
+        # Started first so a failed warm-up is still topped up (and RSS
+        # recycling still runs) by the health check
+        self._healthcheck_task = asyncio.ensure_future(self._healthcheck_loop())
+        # Scrapes arriving meanwhile wait for the warm browsers instead of launching their own
+        async with self._lock:
+            for _ in range(self.size):
+                self.slots.append(await self._launch())
+        print(f"🌐 Browser pool ready: {self.size} browsers")
+
+    async def _launch(self):
+        # Started here rather than in start() so a failed Playwright start is retried too
+        async with self._playwright_lock:
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+        with timed(SCRAPE_STAGE_SECONDS, stage='launch'):
+            browser = await self.playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+        self.launches += 1
+        return BrowserSlot(browser)
+
+    async def _acquire(self):
+        async with self._lock:
+            live = [slot for slot in self.slots if not slot.retiring and slot.browser.is_connected()]
+            if not live and self._launching:
+                # A replacement is on its way - keep using the retiring browsers meanwhile
+                live = [slot for slot in self.slots if slot.browser.is_connected()]
+            if not live:
+                slot = await self._launch()
+                self.slots.append(slot)
+                live = [slot]
+            slot = min(live, key=lambda s: s.active)
+            slot.active += 1
+            slot.served += 1
+            if self.max_contexts and slot.served >= self.max_contexts and not slot.retiring:
+                slot.retiring = True
+                # Launch the replacement while the retiring browser finishes its work
+                self._schedule_maintenance()
+            return slot
+
+    async def _release(self, slot):
+        async with self._lock:
+            slot.active -= 1
+            maintain = slot.retiring or not slot.browser.is_connected()
+        if maintain:
+            self._schedule_maintenance()
+
+    def _schedule_maintenance(self):
+        """Run _maintain() as a background task - browser close/launch never sits on a scrape's path"""
+        task = asyncio.ensure_future(self._maintain())
+        self._maintenance_tasks.add(task)
+        task.add_done_callback(self._maintenance_tasks.discard)
+
+    async def _maintain(self):
+        """Top the pool back up, then close retired browsers once idle and drop dead ones
+
+        Replacements launch first so a retiring browser keeps serving until
+        one is ready. Browser close/launch take a while, so they happen
+        outside the lock.
+        """
+        async with self._lock:
+            missing = max(0, self.size - len([s for s in self.slots if not s.retiring]) - self._launching)
+            self._launching += missing
+        for _ in range(missing):
+            try:
+                slot = await self._launch()
+                async with self._lock:
+                    self.slots.append(slot)
+            except Exception as e:
+                print(f"Browser launch failed: {e}")
+            finally:
+                self._launching -= 1
+
+        async with self._lock:
+            # The task still launching closes the retired browsers after it
+            finished = [
+                slot for slot in self.slots
+                if (slot.retiring and slot.active == 0 and not self._launching) or not slot.browser.is_connected()
+            ]
+            for slot in finished:
+                self.slots.remove(slot)
+        for slot in finished:
+            self.recycled += 1
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+
+    async def _healthcheck_loop(self):
+        while True:
+            await asyncio.sleep(BROWSER_HEALTHCHECK_INTERVAL)
+            try:
+                rss_mb = browser_tree_rss_mb()
+                if rss_mb is not None and self.max_rss_mb and rss_mb > self.max_rss_mb:
+                    async with self._lock:
+                        # Retire the browser that has done the most work
+                        candidates = [s for s in self.slots if not s.retiring]
+                        if candidates:
+                            max(candidates, key=lambda s: s.served).retiring = True
+                            print(f"Browser RSS {rss_mb:.0f}MB over {self.max_rss_mb}MB, recycling a browser")
+                await self._maintain()
+            except Exception as e:
+                print(f"Browser pool health check failed: {e}")
+
+    @asynccontextmanager
+    async def context(self, **options):
+        """Fresh browser context on a pooled browser, closed on exit"""
+        slot = await self._acquire()
+        context = None
+        try:
+            with timed(SCRAPE_STAGE_SECONDS, stage='context'):
+                context = await slot.browser.new_context(**options)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._release(slot)
+
+    def stats(self):
+        return {
+            'browsers': len(self.slots),
+            'active_contexts': sum(slot.active for slot in self.slots),
+            'contexts_served': [slot.served for slot in self.slots],
+            'launches': self.launches,
+            'recycled': self.recycled,
+            'browser_rss_mb': browser_tree_rss_mb()
+        }
+
+
+browser_pool = BrowserPool(BROWSER_POOL_SIZE, BROWSER_MAX_CONTEXTS, BROWSER_MAX_RSS_MB)
+
+# All scrapes run as coroutines on one event loop in a background thread
+# for the life of the worker (the pool's Playwright objects belong to it).
+# Request threads only submit work and wait, so a single worker process can
+# keep SCRAPE_CONCURRENCY scrapes in flight on shared browsers.
+SCRAPE_CONCURRENCY = int(os.environ.get('SCRAPE_CONCURRENCY', 24))
+SCRAPE_TIMEOUT = float(os.environ.get('SCRAPE_TIMEOUT', 900))
+
+_scraper_loop = None
+_scraper_loop_pid = None
+_scraper_loop_lock = threading.Lock()
+_scrape_semaphore = None
+scrape_stats = {'in_flight': 0, 'waiting': 0, 'completed': 0, 'hedged': 0}
+
+
+async def _init_scraper_runtime():
+    global _scrape_semaphore
+    # Created on the loop itself - asyncio primitives bind to a loop on 3.9
+    _scrape_semaphore = asyncio.Semaphore(max(1, SCRAPE_CONCURRENCY))
+    try:
+        await browser_pool.start()
+    except Exception as e:
+        # Launch is retried lazily by the pool on the first scrape
+        print(f"Browser pool warm-up failed: {e}")
+
+
+def start_scraper_runtime():
+    """Start the scraper event loop thread and the browser pool warm-up (once per process)
+
+    Returns straight away - the warm-up runs on the loop, and the first
+    scrapes queue behind it there. Threads do not survive a fork, so a
+    forked process starts its own loop.
+    """
+    global _scraper_loop, _scraper_loop_pid
+    with _scraper_loop_lock:
+        if _scraper_loop is not None and _scraper_loop_pid == os.getpid():
+            return _scraper_loop
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='scraper-loop', daemon=True).start()
+        # Scheduled before any scrape, so the semaphore exists by the time one runs
+        asyncio.run_coroutine_threadsafe(_init_scraper_runtime(), loop)
+        _scraper_loop = loop
+        _scraper_loop_pid = os.getpid()
+        return loop
+
+
+async def run_scrape(url, debug=False, intercept=None, screenshot=None):
+    """Scrape under the per-worker concurrency limit"""
+    scrape_stats['waiting'] += 1
+    started = False
+    try:
+        async with _scrape_semaphore:
+            scrape_stats['waiting'] -= 1
+            scrape_stats['in_flight'] += 1
+            SCRAPES_IN_FLIGHT.inc()
+            started = True
+            try:
+                return await scrape_with_playwright(url, debug, intercept, screenshot)
+            finally:
+                scrape_stats['in_flight'] -= 1
+                SCRAPES_IN_FLIGHT.dec()
+                scrape_stats['completed'] += 1
+    finally:
+        if not started:
+            # Cancelled while still queued for a slot
+            scrape_stats['waiting'] -= 1
+
+
+def run_on_scraper_loop(coro, timeout=None):
+    """Run a coroutine on the scraper loop and block this thread for its result
+
+    On timeout the coroutine is cancelled on the loop and TimeoutError raised.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, start_scraper_runtime())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+# Hero readiness - instead of fixed sleeps, wait on real signals (hero
+# images decoded, lazy images loaded after a scroll, image requests quiet)
+# with HERO_READY_TIMEOUT_MS as a hard upper bound
+HERO_HEIGHT = 800
+HERO_READY_TIMEOUT_MS = int(os.environ.get('HERO_READY_TIMEOUT_MS', 5000))
+HERO_NETWORK_QUIET_MS = int(os.environ.get('HERO_NETWORK_QUIET_MS', 400))
+
+# Verbose per-element extraction logs; also settable per request ("debug": true)
+SCRAPE_DEBUG = os.environ.get('SCRAPE_DEBUG', '0') == '1'
+
+# Scroll down to trigger lazy loading; resolve once the lazy images the
+# IntersectionObserver reports as visible have loaded (or timeoutMs passes)
+LAZY_SCROLL_JS = """
+    async ({ scrollY, timeoutMs }) => {
+        const deadline = new Promise(resolve => setTimeout(() => resolve(false), timeoutMs));
+        window.scrollTo(0, scrollY);
+        const lazy = Array.from(document.querySelectorAll('img[loading="lazy"], img[data-src], img[data-srcset]'));
+        const settled = new Promise(resolve => {
+            if (!lazy.length) {
+                resolve(true);
+                return;
+            }
+            const observer = new IntersectionObserver(entries => {
+                observer.disconnect();
+                const visible = entries.filter(entry => entry.isIntersecting).map(entry => entry.target);
+                Promise.all(visible.map(img => img.complete ? null : new Promise(done => {
+                    img.addEventListener('load', done, { once: true });
+                    img.addEventListener('error', done, { once: true });
+                }))).then(() => resolve(true));
+            });
+            lazy.forEach(img => observer.observe(img));
+        });
+        const ok = await Promise.race([settled, deadline]);
+        window.scrollTo(0, 0);
+        return ok;
+    }
+"""
+
+# True once every sizeable image in the hero region has finished loading
+# and at least one of them actually decoded - or when the hero has no
+# sizeable <img> at all
+HERO_IMAGES_READY_JS = """
+    (heroHeight) => {
+        const hero = Array.from(document.images).filter(img => {
+            const rect = img.getBoundingClientRect();
+            return rect.top < heroHeight && rect.bottom > 0 && rect.width >= 50 && rect.height >= 50;
+        });
+        // No sizeable hero <img> (e.g. a CSS background hero): nothing to
+        // wait for here, the network-quiet signal decides
+        if (!hero.length) {
+            return true;
+        }
+        return hero.every(img => img.complete) && hero.some(img => img.naturalWidth > 0);
+    }
+"""
+
+
+class ImageRequestTracker:
+    """Follows in-flight image requests on a page so we can wait for quiet"""
+
+    def __init__(self, page):
+        self.pending = set()
+        self.last_change = time.monotonic()
+        page.on('request', self._on_request)
+        page.on('requestfinished', self._on_done)
+        page.on('requestfailed', self._on_done)
+
+    def _on_request(self, request):
+        if request.resource_type == 'image':
+            self.pending.add(request)
+            self.last_change = time.monotonic()
+
+    def _on_done(self, request):
+        if request in self.pending:
+            self.pending.discard(request)
+            self.last_change = time.monotonic()
+
+    async def wait_quiet(self, quiet_ms, deadline):
+        while time.monotonic() < deadline:
+            if not self.pending and (time.monotonic() - self.last_change) * 1000 >= quiet_ms:
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+
+async def wait_for_hero_ready(page, image_tracker=None):
+    """Wait until the hero region has loaded, never longer than HERO_READY_TIMEOUT_MS
+
+    Returns which readiness signals fired and how long it took.
+    """
+    started = time.monotonic()
+    deadline = started + HERO_READY_TIMEOUT_MS / 1000
+    signals = {'lazy_images': False, 'hero_images': False, 'network_quiet': False}
+
+    def remaining_ms():
+        return max(0, int((deadline - time.monotonic()) * 1000))
+
+    try:
+        signals['lazy_images'] = await page.evaluate(
+            LAZY_SCROLL_JS, {'scrollY': 500, 'timeoutMs': remaining_ms()}
+        )
+    except Exception as e:
+        print(f"Lazy-load scroll failed: {e}")
+
+    # wait_for_function treats timeout=0 as "no timeout", so skip when spent
+    if remaining_ms() > 0:
+        try:
+            await page.wait_for_function(HERO_IMAGES_READY_JS, arg=HERO_HEIGHT, timeout=remaining_ms())
+            signals['hero_images'] = True
+        except Exception:
+            pass
+
+    if image_tracker is not None:
+        signals['network_quiet'] = await image_tracker.wait_quiet(HERO_NETWORK_QUIET_MS, deadline)
+
+    signals['waited_ms'] = int((time.monotonic() - started) * 1000)
+    return signals
+
+
+# Single pass over the hero region: a TreeWalker that rejects any subtree
+# starting below heroHeight, reading each element's rect once and computed
+# style only for elements big enough to carry a background photo
+HERO_EXTRACT_JS = """
+    ({ heroHeight, debug }) => {
+        const started = performance.now();
+        const images = [];
+        const seenUrls = new Set();
+        const log = [];
+        let visited = 0;
+        let styleReads = 0;
+
+        const addImage = (url, width, height, top, source) => {
+            if (!url || seenUrls.has(url)) return;
+            if (!url.startsWith('http')) return;
+            if (url.includes('logo') || url.includes('icon') || url.includes('avatar')) return;
+            if (url.includes('sprite') || url.includes('placeholder')) return;
+            if (width < 50 || height < 50) return;
+
+            seenUrls.add(url);
+            images.push({ url, width, height, top, source });
+        };
+
+        const firstSrcset = (srcset) => srcset ? srcset.split(',')[0].trim().split(' ')[0] : null;
+
+        const visitImg = (img, rect) => {
+            const src = img.src || img.currentSrc || img.dataset.src || firstSrcset(img.srcset);
+            if (debug && log.length < 10) {
+                log.push(`  img: src=${(src || '').substring(0, 50)}, top=${rect.top.toFixed(0)}, w=${rect.width.toFixed(0)}, h=${rect.height.toFixed(0)}`);
+            }
+            addImage(src, rect.width, rect.height, rect.top, 'img_tag');
+        };
+
+        const visitPicture = (picture, rect) => {
+            picture.querySelectorAll('source').forEach((source) => {
+                addImage(firstSrcset(source.srcset), rect.width || 300, rect.height || 200, rect.top, 'picture_source');
+            });
+            const img = picture.querySelector('img');
+            if (img) {
+                addImage(img.currentSrc || img.src, rect.width || 300, rect.height || 200, rect.top, 'picture_img');
+            }
+        };
+
+        // nextNode() returns the node acceptNode just accepted, so its rect is reused
+        let rect = null;
+        const walker = document.createTreeWalker(document.body || document.documentElement, NodeFilter.SHOW_ELEMENT, {
+            acceptNode: (el) => {
+                rect = el.getBoundingClientRect();
+                // Everything inside an element that starts below the hero is below it too
+                if (rect.top >= heroHeight) return NodeFilter.FILTER_REJECT;
+                return NodeFilter.FILTER_ACCEPT;
+            }
+        });
+
+        for (let el = walker.nextNode(); el; el = walker.nextNode()) {
+            visited++;
+
+            if (el.tagName === 'IMG') {
+                visitImg(el, rect);
+            } else if (el.tagName === 'PICTURE') {
+                visitPicture(el, rect);
+            }
+
+            if (rect.width > 100 && rect.height > 80) {
+                styleReads++;
+                const bgImage = window.getComputedStyle(el).backgroundImage;
+                if (bgImage && bgImage !== 'none' && bgImage.includes('url(')) {
+                    const urlMatch = bgImage.match(/url\\(["']?([^"')]+)["']?\\)/);
+                    if (urlMatch && urlMatch[1]) {
+                        if (debug) log.push(`  bg: ${urlMatch[1].substring(0, 60)}`);
+                        addImage(urlMatch[1], rect.width, rect.height, rect.top, 'background');
+                    }
+                }
+            }
+        }
+
+        // Redfin gallery photos count wherever they sit, as before
+        document.querySelectorAll([
+            '.HomeViews img',
+            '.PhotosView img',
+            '[data-rf-test-id="gallery-photo"] img',
+            '.MediaGallery img',
+            '.photo-carousel img',
+            '.listing-hero img',
+            '.hero-image img',
+            '.main-photo img'
+        ].join(',')).forEach((img) => {
+            const src = img.currentSrc || img.src;
+            if (src && !seenUrls.has(src)) {
+                const rect = img.getBoundingClientRect();
+                addImage(src, rect.width, rect.height, rect.top, 'redfin_specific');
+            }
+        });
+
+        const summary = `Visited ${visited} hero elements, ${styleReads} style reads, ` +
+            `${images.length} images in ${(performance.now() - started).toFixed(1)}ms`;
+        return { images: images, debug: debug ? [summary].concat(log) : [summary] };
+    }
+"""
 
 
-async def extract_hero_images(page):
-    """Extract images from the hero area (top 700px) of the page"""
+async def extract_hero_images(page, image_tracker=None, debug=False):
+    """Extract images from the hero area (top 800px) of the page
+
+    debug=True adds per-element details to the returned debug info.
+    """
     hero_images = []
+    debug_info = []
 
     try:
         # Wait for page to be fully loaded
         # Skip networkidle - it hangs on complex pages like Redfin
-        # Just wait for DOM to be ready and give images time to load
+        # Just wait for DOM to be ready, then for the hero images themselves
         await page.wait_for_load_state('domcontentloaded', timeout=15000)
 
-        # Additional wait for lazy-loaded images
-        await asyncio.sleep(2)  # Reduced from 3s
-
-        # Scroll down slightly to trigger lazy loading, then back up
-        await page.evaluate('window.scrollTo(0, 500)')
-        await asyncio.sleep(1)
-        await page.evaluate('window.scrollTo(0, 0)')
-        await asyncio.sleep(2)
-
-        # JavaScript to extract images from hero area
-        js_code = """
-            () => {
-                const heroHeight = 800;
-                const images = [];
-                const seenUrls = new Set();
-                const debug = [];
-
-                const addImage = (url, width, height, top, source) => {
-                    if (!url || seenUrls.has(url)) return;
-                    if (!url.startsWith('http')) return;
-                    if (url.includes('logo') || url.includes('icon') || url.includes('avatar')) return;
-                    if (url.includes('sprite') || url.includes('placeholder')) return;
-                    if (width < 50 || height < 50) return;
-
-                    seenUrls.add(url);
-                    images.push({ url, width, height, top, source });
-                };
-
-                // Debug: Count all elements
-                debug.push('Total img tags: ' + document.querySelectorAll('img').length);
-                debug.push('Total picture tags: ' + document.querySelectorAll('picture').length);
-
-                // Debug: Find ALL img tags and log their details
-                const allImgs = document.querySelectorAll('img');
-                debug.push('First 10 img details:');
-                allImgs.forEach((img, i) => {
-                    if (i < 10) {
-                        const rect = img.getBoundingClientRect();
-                        debug.push(`  img[${i}]: src=${img.src?.substring(0,50)}, top=${rect.top.toFixed(0)}, w=${rect.width.toFixed(0)}, h=${rect.height.toFixed(0)}`);
-                    }
-                });
-
-                // Method 1: Standard img tags
-                document.querySelectorAll('img').forEach((img) => {
-                    const rect = img.getBoundingClientRect();
-                    const possibleSrcs = [
-                        img.src,
-                        img.currentSrc,
-                        img.dataset.src,
-                        img.getAttribute('data-src'),
-                        img.srcset ? img.srcset.split(',')[0].trim().split(' ')[0] : null
-                    ].filter(Boolean);
-
-                    if (rect.top < heroHeight && possibleSrcs.length > 0) {
-                        const src = possibleSrcs[0];
-                        addImage(src, rect.width, rect.height, rect.top, 'img_tag');
-                    }
-                });
-
-                // Method 2: Background images - check ALL elements in hero area
-                debug.push('Checking background images...');
-                let bgCount = 0;
-                document.querySelectorAll('*').forEach((el) => {
-                    const rect = el.getBoundingClientRect();
-                    if (rect.top < heroHeight && rect.width > 100 && rect.height > 80) {
-                        const style = window.getComputedStyle(el);
-                        const bgImage = style.backgroundImage;
-                        if (bgImage && bgImage !== 'none' && bgImage.includes('url(')) {
-                            bgCount++;
-                            const urlMatch = bgImage.match(/url\(["']?([^"')]+)["']?\)/);
-                            if (urlMatch && urlMatch[1]) {
-                                if (bgCount <= 5) {
-                                    debug.push(`  bg[${bgCount}]: ${urlMatch[1].substring(0,60)}`);
-                                }
-                                addImage(urlMatch[1], rect.width, rect.height, rect.top, 'background');
-                            }
-                        }
-                    }
-                });
-                debug.push('Total background images found: ' + bgCount);
-
-                // Method 3: Picture/source elements
-                document.querySelectorAll('picture').forEach((picture) => {
-                    const rect = picture.getBoundingClientRect();
-                    if (rect.top < heroHeight) {
-                        picture.querySelectorAll('source').forEach((source) => {
-                            const srcset = source.srcset;
-                            if (srcset) {
-                                const src = srcset.split(',')[0].trim().split(' ')[0];
-                                addImage(src, rect.width || 300, rect.height || 200, rect.top, 'picture_source');
-                            }
-                        });
-                        const img = picture.querySelector('img');
-                        if (img) {
-                            const src = img.currentSrc || img.src;
-                            addImage(src, rect.width || 300, rect.height || 200, rect.top, 'picture_img');
-                        }
-                    }
-                });
-
-                // Method 4: Redfin-specific - look for their photo containers
-                debug.push('Checking Redfin-specific selectors...');
-                const redfinSelectors = [
-                    '.HomeViews img',
-                    '.PhotosView img', 
-                    '[data-rf-test-id="gallery-photo"] img',
-                    '.MediaGallery img',
-                    '.photo-carousel img',
-                    '.listing-hero img',
-                    '.hero-image img',
-                    '.main-photo img'
-                ];
-                redfinSelectors.forEach(selector => {
-                    const els = document.querySelectorAll(selector);
-                    if (els.length > 0) {
-                        debug.push(`  ${selector}: ${els.length} found`);
-                        els.forEach(img => {
-                            const rect = img.getBoundingClientRect();
-                            const src = img.currentSrc || img.src;
-                            if (src) addImage(src, rect.width, rect.height, rect.top, 'redfin_specific');
-                        });
-                    }
-                });
-
-                debug.push('Total images extracted: ' + images.length);
-                return { images: images, debug: debug };
-            }
-        """
+        with timed(SCRAPE_STAGE_SECONDS, stage='ready'):
+            ready = await wait_for_hero_ready(page, image_tracker)
+        print(f"Hero readiness: {ready}")
 
-        js_result = await page.evaluate(js_code)
+        with timed(SCRAPE_STAGE_SECONDS, stage='extract'):
+            js_result = await page.evaluate(HERO_EXTRACT_JS, {'heroHeight': HERO_HEIGHT, 'debug': debug})
         hero_images = js_result.get('images', []) if isinstance(js_result, dict) else js_result
         debug_info = js_result.get('debug', []) if isinstance(js_result, dict) else []
-        print(f"DEBUG INFO: {debug_info}")
+        debug_info.insert(0, f"Hero readiness: {ready}")
+        if debug:
+            print(f"DEBUG INFO: {debug_info}")
+        else:
+            print(debug_info[-1])
         print(f"Extracted {len(hero_images)} hero images")
 
     except Exception as e:
@@ -190,16 +584,482 @@ async def extract_hero_images(page):
     return hero_images, debug_info
 
 
-async def scrape_with_playwright(url):
-    """Scrape a URL using Playwright with Bright Data proxy"""
-    global session_cache
+# Request interception - every request goes through the per-GB proxy, so
+# drop what the hero extraction never looks at: fonts, media, tracker/ad
+# hosts, and images that are neither listing photos nor first-party
+SCRAPE_INTERCEPT = os.environ.get('SCRAPE_INTERCEPT', '1') == '1'
+
+
+def _env_list(name, default):
+    return [item.strip().lower() for item in os.environ.get(name, default).split(',') if item.strip()]
+
+
+SCRAPE_BLOCK_RESOURCE_TYPES = set(_env_list('SCRAPE_BLOCK_RESOURCE_TYPES', 'font,media,texttrack'))
+# 'hero' blocks images that are not listing photos or first-party; 'all' allows every image
+SCRAPE_IMAGE_POLICY = os.environ.get('SCRAPE_IMAGE_POLICY', 'hero')
+SCRAPE_BLOCKED_DOMAINS = _env_list('SCRAPE_BLOCKED_DOMAINS', ','.join([
+    'google-analytics.com', 'googletagmanager.com', 'googleadservices.com',
+    'doubleclick.net', 'googlesyndication.com', 'adservice.google.com',
+    'facebook.net', 'connect.facebook.net', 'bat.bing.com', 'clarity.ms',
+    'hotjar.com', 'fullstory.com', 'segment.io', 'segment.com', 'mixpanel.com',
+    'optimizely.com', 'newrelic.com', 'nr-data.net', 'branch.io',
+    'quantserve.com', 'scorecardresearch.com', 'criteo.com', 'criteo.net',
+    'taboola.com', 'outbrain.com', 'adsrvr.org', 'amazon-adsystem.com',
+    'analytics.tiktok.com', 'ct.pinterest.com', 'snap.licdn.com', 'px.ads.linkedin.com'
+]))
+# Listing photo CDNs - always allowed, even when third-party to the page
+SCRAPE_LISTING_PHOTO_PATTERNS = _env_list('SCRAPE_LISTING_PHOTO_PATTERNS', ','.join([
+    'cdn-redfin.com/photo', 'photos.zillowstatic.com', 'rdcpix.com', 'images.homes.com'
+]))
+# Images that are never in the hero: map tiles, street view, agent headshots
+SCRAPE_BLOCKED_IMAGE_PATTERNS = _env_list('SCRAPE_BLOCKED_IMAGE_PATTERNS', ','.join([
+    'maps.googleapis.com', 'maps.gstatic.com', 'api.mapbox.com', 'tiles.mapbox.com',
+    'streetviewpixels', '/agent-photo', '/agentphoto', 'headshot'
+]))
+
+
+def _host_matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+def _site_of(host):
+    # Last two labels - close enough to a registrable domain for the sites we scrape
+    return '.'.join(host.split('.')[-2:])
+
+
+class ScrapeNetworkPolicy:
+    """Blocks unneeded requests for a page and accounts the bytes of the rest
+
+    Bytes are what went over the wire (headers + encoded body, both ways),
+    i.e. what the proxy bills for.
+    """
+
+    def __init__(self, page_url, enabled=SCRAPE_INTERCEPT, debug=False):
+        self.page_site = _site_of((urlsplit(page_url).hostname or '').lower())
+        self.enabled = enabled
+        self.debug = debug
+        self.blocked = {}
+        self.by_type = {}
+        self.requests = []
+        self._measures = []
+
+    async def install(self, page):
+        page.on('requestfinished', self._on_finished)
+        if self.enabled:
+            await page.route('**/*', self._route)
+
+    def block_reason(self, request):
+        """Why a request should be blocked, or None to let it through"""
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            return None
+        url = request.url.lower()
+        host = (urlsplit(url).hostname or '')
+        if _host_matches(host, SCRAPE_BLOCKED_DOMAINS):
+            return 'tracker'
+        resource_type = request.resource_type
+        if resource_type in SCRAPE_BLOCK_RESOURCE_TYPES:
+            return resource_type
+        if resource_type == 'image' and SCRAPE_IMAGE_POLICY == 'hero':
+            if any(pattern in url for pattern in SCRAPE_BLOCKED_IMAGE_PATTERNS):
+                return 'offhero_image'
+            if any(pattern in url for pattern in SCRAPE_LISTING_PHOTO_PATTERNS):
+                return None
+            if _site_of(host) != self.page_site:
+                return 'third_party_image'
+        return None
+
+    async def _route(self, route):
+        reason = self.block_reason(route.request)
+        try:
+            if reason:
+                self.blocked[reason] = self.blocked.get(reason, 0) + 1
+                await route.abort('blockedbyclient')
+            else:
+                await route.continue_()
+        except Exception as e:
+            # Page or context already closed
+            print(f"Route handling failed for {route.request.url[:100]}: {e}")
+
+    def _on_finished(self, request):
+        self._measures.append(asyncio.ensure_future(self._measure(request)))
+
+    async def _measure(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        transferred = sum(max(sizes.get(key, 0), 0) for key in (
+            'requestHeadersSize', 'requestBodySize', 'responseHeadersSize', 'responseBodySize'))
+        bucket = self.by_type.setdefault(request.resource_type, {'requests': 0, 'bytes': 0})
+        bucket['requests'] += 1
+        bucket['bytes'] += transferred
+        if self.debug:
+            self.requests.append({'url': request.url[:200], 'type': request.resource_type, 'bytes': transferred})
+
+    async def report(self):
+        """Network summary for the scrape result; call before the page closes"""
+        if self._measures:
+            await asyncio.wait(self._measures, timeout=2)
+        report = {
+            'intercept': self.enabled,
+            'requests': sum(bucket['requests'] for bucket in self.by_type.values()),
+            'bytes': sum(bucket['bytes'] for bucket in self.by_type.values()),
+            'by_type': self.by_type,
+            'blocked': self.blocked,
+            'blocked_total': sum(self.blocked.values())
+        }
+        if self.debug:
+            report['per_request'] = sorted(self.requests, key=lambda item: -item['bytes'])
+        return report
+
+
+# Screenshots - opt-in per request ("screenshot": true or an options object),
+# optionally clipped to the hero, downscaled and re-encoded as JPEG/WebP, and
+# either inlined as base64 or written to a content-addressed store on disk
+SCREENSHOT_FORMATS = {'png': 'image/png', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+SCREENSHOT_DEFAULT_FORMAT = os.environ.get('SCREENSHOT_DEFAULT_FORMAT', 'jpeg')
+SCREENSHOT_DEFAULT_QUALITY = int(os.environ.get('SCREENSHOT_DEFAULT_QUALITY', 70))
+SCREENSHOT_STORE_DIR = os.environ.get('SCREENSHOT_STORE_DIR', 'screenshots')
+SCREENSHOT_STORE_MAX_FILES = int(os.environ.get('SCREENSHOT_STORE_MAX_FILES', 1000))
+SCREENSHOT_NAME_RE = re.compile(r'^[0-9a-f]{64}\.(png|jpeg|webp)$')
+
+
+def parse_screenshot_options(value):
+    """Validate the "screenshot" request field; None means no screenshot
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError('screenshot must be true, false or an options object')
+
+    image_format = str(value.get('format', SCREENSHOT_DEFAULT_FORMAT)).lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in SCREENSHOT_FORMATS:
+        raise ValueError(f"screenshot format must be one of: {', '.join(SCREENSHOT_FORMATS)}")
+
+    try:
+        quality = int(value.get('quality', SCREENSHOT_DEFAULT_QUALITY))
+        max_width = int(value['max_width']) if value.get('max_width') is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('screenshot quality and max_width must be integers')
+    if not 1 <= quality <= 100:
+        raise ValueError('screenshot quality must be between 1 and 100')
+    if max_width is not None and not 16 <= max_width <= 1920:
+        raise ValueError('screenshot max_width must be between 16 and 1920')
+
+    clip = value.get('clip', 'viewport')
+    if clip not in ('viewport', 'hero'):
+        raise ValueError("screenshot clip must be 'viewport' or 'hero'")
+
+    return {
+        'format': image_format,
+        'quality': quality,
+        'max_width': max_width,
+        'clip': clip,
+        'store': bool(value.get('store', False))
+    }
+
+
+def encode_screenshot(png_bytes, options):
+    """Downscale and re-encode a PNG capture; returns (bytes, width, height)"""
+    image = Image.open(io.BytesIO(png_bytes))
+    if options['max_width'] and image.width > options['max_width']:
+        height = max(1, round(image.height * options['max_width'] / image.width))
+        image = image.resize((options['max_width'], height), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if options['format'] == 'png':
+        image.save(buffer, format='PNG', optimize=True)
+    elif options['format'] == 'jpeg':
+        image.convert('RGB').save(buffer, format='JPEG', quality=options['quality'], optimize=True)
+    else:
+        image.save(buffer, format='WEBP', quality=options['quality'], method=4)
+    return buffer.getvalue(), image.width, image.height
+
+
+def store_screenshot(data, image_format):
+    """Write a screenshot to the content-addressed store; returns its file name"""
+    name = f"{hashlib.sha256(data).hexdigest()}.{image_format}"
+    path = os.path.join(SCREENSHOT_STORE_DIR, name)
+    os.makedirs(SCREENSHOT_STORE_DIR, exist_ok=True)
+    if not os.path.exists(path):
+        # Write then rename so the route never serves a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=SCREENSHOT_STORE_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        prune_screenshot_store()
+    return name
+
+
+def prune_screenshot_store():
+    """Drop the oldest screenshots beyond SCREENSHOT_STORE_MAX_FILES"""
+    try:
+        entries = [entry for entry in os.scandir(SCREENSHOT_STORE_DIR) if SCREENSHOT_NAME_RE.match(entry.name)]
+        if len(entries) <= SCREENSHOT_STORE_MAX_FILES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - SCREENSHOT_STORE_MAX_FILES]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"Warning: screenshot store prune failed: {e}")
+
+
+async def capture_screenshot(page, options):
+    """Take the screenshot described by options; returns the result fields"""
+    viewport = page.viewport_size or {'width': 1920, 'height': 1080}
+    height = min(HERO_HEIGHT, viewport['height']) if options['clip'] == 'hero' else viewport['height']
+    clip = {'x': 0, 'y': 0, 'width': viewport['width'], 'height': height}
+
+    if options['max_width'] is None and options['format'] in ('png', 'jpeg'):
+        # Chromium can encode these itself - skip the Pillow round trip
+        kwargs = {'quality': options['quality']} if options['format'] == 'jpeg' else {}
+        data = await page.screenshot(type=options['format'], clip=clip, **kwargs)
+        width = viewport['width']
+    else:
+        png_bytes = await page.screenshot(type='png', clip=clip)
+        loop = asyncio.get_running_loop()
+        data, width, height = await loop.run_in_executor(None, encode_screenshot, png_bytes, options)
+
+    info = {
+        'format': options['format'],
+        'content_type': SCREENSHOT_FORMATS[options['format']],
+        'width': width,
+        'height': height,
+        'bytes': len(data)
+    }
+    if options['store']:
+        loop = asyncio.get_running_loop()
+        name = await loop.run_in_executor(None, store_screenshot, data, options['format'])
+        info['url'] = f"/screenshots/{name}"
+    else:
+        info['base64'] = base64.b64encode(data).decode('utf-8')
+    return info
+
+
+# Hero photos - after extraction the candidates are downloaded concurrently
+# over a pooled HTTP client (direct, not through the per-GB proxy), hashed
+# with a difference hash, and near-duplicates (same photo at another size or
+# on another CDN variant) collapsed so the largest variant wins. The result
+# is a short ranked list of distinct photos with small JPEG thumbnails
+SCRAPE_PHOTOS = os.environ.get('SCRAPE_PHOTOS', '1') == '1'
+SCRAPE_PHOTO_WORKERS = int(os.environ.get('SCRAPE_PHOTO_WORKERS', 8))
+SCRAPE_PHOTO_MAX_CANDIDATES = int(os.environ.get('SCRAPE_PHOTO_MAX_CANDIDATES', 24))
+SCRAPE_PHOTO_MAX_BYTES = int(os.environ.get('SCRAPE_PHOTO_MAX_BYTES', 15 * 1024 * 1024))
+SCRAPE_PHOTO_TIMEOUT = float(os.environ.get('SCRAPE_PHOTO_TIMEOUT', 10))
+SCRAPE_PHOTO_MIN_SIDE = int(os.environ.get('SCRAPE_PHOTO_MIN_SIDE', 150))
+# Hamming distance (of 64 bits) at or below which two photos are the same
+SCRAPE_PHOTO_HASH_DISTANCE = int(os.environ.get('SCRAPE_PHOTO_HASH_DISTANCE', 6))
+SCRAPE_PHOTO_THUMB_SIZE = int(os.environ.get('SCRAPE_PHOTO_THUMB_SIZE', 320))
+SCRAPE_PHOTO_THUMB_QUALITY = int(os.environ.get('SCRAPE_PHOTO_THUMB_QUALITY', 70))
+
+_photo_session = None
+_photo_executor = None
+_photo_lock = threading.Lock()
+
+
+def get_photo_client():
+    """Shared pooled session and download executor, created on first use"""
+    global _photo_session, _photo_executor
+    with _photo_lock:
+        if _photo_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=SCRAPE_PHOTO_WORKERS, pool_maxsize=SCRAPE_PHOTO_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['User-Agent'] = (
+                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            )
+            _photo_session = session
+            _photo_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=SCRAPE_PHOTO_WORKERS, thread_name_prefix='hero-photo')
+        return _photo_session, _photo_executor
+
+
+def difference_hash(image):
+    """64-bit dHash: brightness gradients of a 9x8 grayscale thumbnail"""
+    pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def fetch_hero_photo(candidate, referer):
+    """Download, hash and thumbnail one candidate; returns a photo dict or raises"""
+    session, _ = get_photo_client()
+    with session.get(candidate['url'], headers={'Referer': referer}, timeout=SCRAPE_PHOTO_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > SCRAPE_PHOTO_MAX_BYTES:
+                raise ValueError(f"larger than {SCRAPE_PHOTO_MAX_BYTES} bytes")
+
+    image = Image.open(io.BytesIO(bytes(data)))
+    width, height = image.size
+    # JPEGs decode straight at a reduced scale - the hash and thumbnail need no more
+    image.draft('RGB', (SCRAPE_PHOTO_THUMB_SIZE * 2, SCRAPE_PHOTO_THUMB_SIZE * 2))
+    image = image.convert('RGB')
+    photo_hash = difference_hash(image)
+
+    image.thumbnail((SCRAPE_PHOTO_THUMB_SIZE, SCRAPE_PHOTO_THUMB_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=SCRAPE_PHOTO_THUMB_QUALITY, optimize=True)
+
+    return {
+        'url': candidate['url'],
+        'width': width,
+        'height': height,
+        'bytes': len(data),
+        'hash': photo_hash,
+        'display_area': round(candidate.get('width', 0) * candidate.get('height', 0)),
+        'top': candidate.get('top', 0),
+        'thumbnail': 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('utf-8')
+    }
 
-    # Check session cache (for retries within same request)
-    cache_key = hashlib.md5(url.encode()).hexdigest()
-    if cache_key in session_cache:
-        print(f"Using session cache for {url}")
-        return session_cache[cache_key]
 
+def dedupe_hero_photos(photos):
+    """Collapse near-duplicate photos, keeping the largest variant of each, ranked
+
+    Ranking: largest on-page display area first (the main hero photo), then
+    resolution, then position on the page.
+    """
+    groups = []
+    for photo in sorted(photos, key=lambda p: -p['width'] * p['height']):
+        for group in groups:
+            if bin(group['hash'] ^ photo['hash']).count('1') <= SCRAPE_PHOTO_HASH_DISTANCE:
+                group['variants'].append(photo['url'])
+                group['display_area'] = max(group['display_area'], photo['display_area'])
+                group['top'] = min(group['top'], photo['top'])
+                break
+        else:
+            groups.append(dict(photo, variants=[]))
+
+    groups.sort(key=lambda g: (-g['display_area'], -g['width'] * g['height'], g['top']))
+    ranked = []
+    for rank, group in enumerate(groups, 1):
+        ranked.append({
+            'rank': rank,
+            'url': group['url'],
+            'width': group['width'],
+            'height': group['height'],
+            'bytes': group['bytes'],
+            'hash': f"{group['hash']:016x}",
+            'variants': group['variants'],
+            'thumbnail': group['thumbnail']
+        })
+    return ranked
+
+
+async def collect_hero_photos(hero_images, page_url):
+    """Fetch the candidates concurrently and return (ranked distinct photos, stats)"""
+    started = time.monotonic()
+    candidates = hero_images[:SCRAPE_PHOTO_MAX_CANDIDATES]
+    _, executor = get_photo_client()
+    loop = asyncio.get_running_loop()
+    outcomes = await asyncio.gather(
+        *(loop.run_in_executor(executor, fetch_hero_photo, candidate, page_url) for candidate in candidates),
+        return_exceptions=True
+    )
+
+    photos, failed, small = [], 0, 0
+    for candidate, outcome in zip(candidates, outcomes):
+        if isinstance(outcome, Exception):
+            failed += 1
+            print(f"Hero photo fetch failed for {candidate['url'][:100]}: {outcome}")
+        elif min(outcome['width'], outcome['height']) < SCRAPE_PHOTO_MIN_SIDE:
+            small += 1
+        else:
+            photos.append(outcome)
+
+    ranked = dedupe_hero_photos(photos)
+    stats = {
+        'candidates': len(candidates),
+        'downloaded': len(photos) + small,
+        'failed': failed,
+        'too_small': small,
+        'duplicates': len(photos) - len(ranked),
+        'distinct': len(ranked),
+        'elapsed_ms': round((time.monotonic() - started) * 1000)
+    }
+    print(f"Hero photos: {stats}")
+    return ranked, stats
+
+
+# Hedged attempts - a second attempt on a fresh proxy session starts when
+# the running one has not reached DOM-ready within SCRAPE_HEDGE_DELAY; the
+# first success wins and the rest are cancelled. Failed attempts are
+# classified and each class backs off on its own schedule
+SCRAPE_MAX_ATTEMPTS = int(os.environ.get('SCRAPE_MAX_ATTEMPTS', 10))
+SCRAPE_MAX_PARALLEL = int(os.environ.get('SCRAPE_MAX_PARALLEL', 2))
+SCRAPE_HEDGE_DELAY = float(os.environ.get('SCRAPE_HEDGE_DELAY', 8))
+SCRAPE_BACKOFF = {
+    # A block page means a burned exit IP - rotate quickly, but back off if it keeps happening
+    'block': float(os.environ.get('SCRAPE_BACKOFF_BLOCK', 2)),
+    'proxy': float(os.environ.get('SCRAPE_BACKOFF_PROXY', 1)),
+    # The attempt already used its whole navigation timeout
+    'timeout': float(os.environ.get('SCRAPE_BACKOFF_TIMEOUT', 0)),
+    'other': float(os.environ.get('SCRAPE_BACKOFF_OTHER', 2))
+}
+SCRAPE_BACKOFF_MAX = float(os.environ.get('SCRAPE_BACKOFF_MAX', 30))
+SCRAPE_BLOCK_STATUSES = {403, 407, 429, 503}
+SCRAPE_BLOCK_TITLE_PATTERNS = _env_list('SCRAPE_BLOCK_TITLE_PATTERNS', ','.join([
+    'access denied', 'access to this page has been denied', 'are you a robot', 'captcha',
+    'just a moment', 'attention required', 'pardon our interruption', 'request blocked', 'forbidden'
+]))
+PROXY_ERROR_MARKERS = (
+    'err_proxy', 'err_tunnel_connection_failed', 'err_connection_reset', 'err_connection_closed',
+    'err_connection_refused', 'err_empty_response', 'err_socks', 'err_timed_out', 'err_name_not_resolved'
+)
+scrape_failure_stats = {kind: 0 for kind in SCRAPE_BACKOFF}
+
+
+class ScrapeFailure(Exception):
+    """An attempt failed in a way we recognised; kind is a SCRAPE_BACKOFF key"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+def detect_block_page(response, title):
+    """Reason the page looks like a bot wall instead of the listing, or None"""
+    if response is not None and response.status in SCRAPE_BLOCK_STATUSES:
+        return f"HTTP {response.status}"
+    lowered = (title or '').lower()
+    for pattern in SCRAPE_BLOCK_TITLE_PATTERNS:
+        if pattern in lowered:
+            return f"block page title: {title[:80]}"
+    return None
+
+
+def classify_scrape_failure(error):
+    if isinstance(error, ScrapeFailure):
+        return error.kind
+    if isinstance(error, (PlaywrightTimeoutError, asyncio.TimeoutError)):
+        return 'timeout'
+    message = str(error).lower()
+    if any(marker in message for marker in PROXY_ERROR_MARKERS):
+        return 'proxy'
+    return 'other'
+
+
+def scrape_backoff(kind, count):
+    """Full-jitter exponential backoff for the count-th failure of a kind"""
+    delay = min(SCRAPE_BACKOFF_MAX, SCRAPE_BACKOFF[kind] * (2 ** (count - 1)))
+    return random.uniform(0, delay)
+
+
+async def scrape_attempt(url, attempt, dom_ready, debug=False, intercept=None, screenshot=None):
+    """One scrape on a fresh proxy session; sets dom_ready once the DOM has loaded"""
     result = {
         'success': False,
         'url': url,
@@ -209,94 +1069,424 @@ async def scrape_with_playwright(url):
         'screenshot_base64': ''
     }
 
-    # Session ID is now generated fresh for each attempt by get_proxy_user()
+    # Create FRESH context on a pooled browser - no cookies, no cache
+    async with browser_pool.context(
+        proxy={
+            "server": f"http://{PROXY_HOST}:{PROXY_PORT}",
+            "username": get_proxy_user(),  # Fresh session ID (new IP) per attempt
+            "password": PROXY_PASS
+        },
+        viewport={'width': 1920, 'height': 1080},
+        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        bypass_csp=True,
+        ignore_https_errors=True
+    ) as context:
+        page = await context.new_page()
+        image_tracker = ImageRequestTracker(page)
+        network = ScrapeNetworkPolicy(url, SCRAPE_INTERCEPT if intercept is None else intercept, debug)
+        await network.install(page)
+
+        # Navigate with timeout
+        timeout = 60000 if attempt == 1 else 45000
+        with timed(SCRAPE_STAGE_SECONDS, stage='goto'):
+            response = await page.goto(url, wait_until='domcontentloaded', timeout=timeout)
+        dom_ready.set()
+
+        # Get title
+        result['title'] = await page.title()
+        print(f"Attempt {attempt} page title: {result['title']}")
+
+        block = detect_block_page(response, result['title'])
+        if block:
+            raise ScrapeFailure('block', block)
+
+        # Verify we're on the right page
+        print(f"Attempt {attempt} current URL: {page.url}")
+
+        # Extract hero images
+        hero_images, debug_info = await extract_hero_images(page, image_tracker, debug)
+        result['hero_images'] = hero_images
+        result['debug_info'] = debug_info
+        result['hero_image_count'] = len(result['hero_images'])
+
+        # Screenshot only when the caller asked for one
+        if screenshot:
+            with timed(SCRAPE_STAGE_SECONDS, stage='screenshot'):
+                shot = await capture_screenshot(page, screenshot)
+            result['screenshot_base64'] = shot.pop('base64', '')
+            result['screenshot'] = shot
+
+        result['network'] = await network.report()
+        print(f"Network: {result['network']['requests']} requests, "
+              f"{result['network']['bytes'] / 1024:.0f} KB, {result['network']['blocked_total']} blocked")
+
+        result['success'] = True
 
-    max_retries = 10
+    return result
 
-    for attempt in range(max_retries):
-        browser = None
-        playwright = None
-        try:
-            print(f"Attempt {attempt + 1}/{max_retries} for {url}")
-            # Session ID is generated fresh for each proxy connection
 
-            playwright = await async_playwright().start()
+async def scrape_with_playwright(url, debug=False, intercept=None, screenshot=None):
+    """Scrape a URL using Playwright with Bright Data proxy, then collect its distinct hero photos"""
+    result = await scrape_hedged(url, debug, intercept, screenshot)
+    if result['success'] and SCRAPE_PHOTOS and result['hero_images']:
+        with timed(SCRAPE_STAGE_SECONDS, stage='photos'):
+            result['photos'], result['photo_stats'] = await collect_hero_photos(result['hero_images'], url)
+        result['elapsed_ms'] = round(result['elapsed_ms'] + result['photo_stats']['elapsed_ms'])
+    return result
+
+
+async def scrape_hedged(url, debug=False, intercept=None, screenshot=None):
+    """Run scrape attempts, hedging slow ones; returns the first success or the last failure"""
+    started = time.monotonic()
+    running = {}  # task -> (attempt number, dom_ready event, start time)
+    attempts = []
+    failure_counts = {}
+    launched = 0
+    next_launch_at = started
+    last_error = None
+
+    def launch():
+        nonlocal launched
+        launched += 1
+        dom_ready = asyncio.Event()
+        task = asyncio.ensure_future(scrape_attempt(url, launched, dom_ready, debug, intercept, screenshot))
+        running[task] = (launched, dom_ready, time.monotonic())
+        print(f"Attempt {launched}/{SCRAPE_MAX_ATTEMPTS} for {url}" + (" (hedge)" if len(running) > 1 else ""))
+
+    try:
+        while True:
+            now = time.monotonic()
+            if not running:
+                if launched >= SCRAPE_MAX_ATTEMPTS:
+                    break
+                if now < next_launch_at:
+                    await asyncio.sleep(next_launch_at - now)
+                launch()
+                continue
+
+            # Hedge when the newest attempt is still short of DOM-ready past the budget
+            wait_timeout = None
+            newest_number, newest_ready, newest_start = max(running.values(), key=lambda item: item[2])
+            if len(running) < SCRAPE_MAX_PARALLEL and launched < SCRAPE_MAX_ATTEMPTS and not newest_ready.is_set():
+                hedge_at = max(newest_start + SCRAPE_HEDGE_DELAY, next_launch_at)
+                if now >= hedge_at:
+                    scrape_stats['hedged'] += 1
+                    launch()
+                    continue
+                wait_timeout = hedge_at - now
+
+            done, _ = await asyncio.wait(list(running), timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                number, _, attempt_start = running.pop(task)
+                elapsed_ms = round((time.monotonic() - attempt_start) * 1000)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    kind = classify_scrape_failure(e)
+                    failure_counts[kind] = failure_counts.get(kind, 0) + 1
+                    scrape_failure_stats[kind] += 1
+                    SCRAPE_ATTEMPTS.labels(outcome=kind).inc()
+                    delay = scrape_backoff(kind, failure_counts[kind])
+                    next_launch_at = max(next_launch_at, time.monotonic() + delay)
+                    last_error = (kind, str(e))
+                    attempts.append({'attempt': number, 'failure': kind, 'error': str(e)[:300], 'elapsed_ms': elapsed_ms})
+                    print(f"Attempt {number} failed ({kind}, backoff {delay:.1f}s): {e}")
+                    continue
+
+                attempts.append({'attempt': number, 'success': True, 'elapsed_ms': elapsed_ms})
+                SCRAPE_ATTEMPTS.labels(outcome='success').inc()
+                result['attempts'] = attempts
+                result['elapsed_ms'] = round((time.monotonic() - started) * 1000)
+                return result
+    finally:
+        # First success wins (or the caller gave up) - stop the other attempts
+        for task, (number, _, attempt_start) in running.items():
+            task.cancel()
+            SCRAPE_ATTEMPTS.labels(outcome='cancelled').inc()
+            attempts.append({'attempt': number, 'cancelled': True,
+                             'elapsed_ms': round((time.monotonic() - attempt_start) * 1000)})
+        if running:
+            await asyncio.wait(list(running), timeout=10)
+
+    return {
+        'success': False,
+        'url': url,
+        'title': '',
+        'hero_images': [],
+        'hero_image_count': 0,
+        'screenshot_base64': '',
+        'error': last_error[1] if last_error else 'No attempts made',
+        'failure': last_error[0] if last_error else 'other',
+        'attempts': attempts,
+        'elapsed_ms': round((time.monotonic() - started) * 1000)
+    }
 
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-            )
 
-            # Create FRESH context - no cookies, no cache
-            context = await browser.new_context(
-                proxy={
-                    "server": f"http://{PROXY_HOST}:{PROXY_PORT}",
-                    "username": get_proxy_user(),  # Fresh session ID each time
-                    "password": PROXY_PASS
-                },
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                bypass_csp=True,
-                ignore_https_errors=True
+# Scrape result cache - successful scrapes are kept in SQLite keyed by the
+# normalized listing URL, so repeats skip the browser and the proxy. Results
+# older than SCRAPE_CACHE_TTL are still served for SCRAPE_CACHE_STALE seconds
+# while a background scrape refreshes them (stale-while-revalidate)
+SCRAPE_CACHE_PATH = os.environ.get('SCRAPE_CACHE_PATH', 'scrape_cache.sqlite3')
+SCRAPE_CACHE_TTL = int(os.environ.get('SCRAPE_CACHE_TTL', 24 * 3600))
+SCRAPE_CACHE_STALE = int(os.environ.get('SCRAPE_CACHE_STALE', 7 * 24 * 3600))
+SCRAPE_CACHE_MAX_ENTRIES = int(os.environ.get('SCRAPE_CACHE_MAX_ENTRIES', 5000))
+# Results carry photo thumbnails, so the entry count alone does not bound the file
+SCRAPE_CACHE_MAX_BYTES = int(os.environ.get('SCRAPE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# Query parameters that never change the page (utm_* is always dropped too)
+SCRAPE_CACHE_IGNORED_PARAMS = {'fbclid', 'gclid', 'msclkid', 'mc_cid', 'mc_eid', 'ref'}
+
+
+def normalize_scrape_url(url):
+    """Canonical form of a listing URL for cache keys"""
+    parts = urlsplit(url.strip())
+    netloc = (parts.hostname or '').lower()
+    if parts.port and parts.port not in (80, 443):
+        netloc += f":{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in SCRAPE_CACHE_IGNORED_PARAMS
+    )
+    return urlunsplit(((parts.scheme or 'https').lower(), netloc, parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+
+def scrape_cache_key(url):
+    return hashlib.sha256(normalize_scrape_url(url).encode()).hexdigest()
+
+
+class ScrapeCache:
+    """Bounded, persistent store of scrape results - one connection per thread
+
+    Least recently served entries are evicted beyond max_entries or
+    max_bytes of stored results, and entries past TTL + stale window are
+    dropped on write.
+    """
+
+    def __init__(self, path, ttl, stale, max_entries, max_bytes=0):
+        self.path = path
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS scrape_cache (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS scrape_cache_accessed ON scrape_cache (accessed_at);
+        """)
+        # Caches created before the byte bound lack size
+        columns = {row['name'] for row in self._connect().execute("PRAGMA table_info(scrape_cache)")}
+        if 'size' not in columns:
+            self._connect().executescript("""
+                ALTER TABLE scrape_cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0;
+                UPDATE scrape_cache SET size = LENGTH(CAST(result AS BLOB));
+            """)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _connect(self):
+        # Connections never cross a fork - a preloaded master's is not reused by its workers
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Returns (result, age_seconds, fresh) or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT result, created_at FROM scrape_cache WHERE key = ? AND created_at > ?",
+            (key, now - self.ttl - self.stale)
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            count_cache('scrape', 'miss')
+            return None
+        conn.execute("UPDATE scrape_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        age = now - row['created_at']
+        fresh = age < self.ttl
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        count_cache('scrape', 'hit' if fresh else 'stale')
+        return json.loads(row['result']), age, fresh
+
+    def put(self, key, url, result):
+        if not self.enabled:
+            return
+        now = time.time()
+        data = json.dumps(result)
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO scrape_cache (key, url, result, created_at, accessed_at, size) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, normalize_scrape_url(url), data, now, now, len(data.encode('utf-8')))
+        )
+        conn.execute("DELETE FROM scrape_cache WHERE created_at <= ?", (now - self.ttl - self.stale,))
+        conn.execute(
+            "DELETE FROM scrape_cache WHERE key IN "
+            "(SELECT key FROM scrape_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        if self.max_bytes > 0:
+            # Keep the most recently served entries that fit in max_bytes
+            conn.execute(
+                "DELETE FROM scrape_cache WHERE key IN (SELECT key FROM ("
+                "SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running FROM scrape_cache"
+                ") WHERE running > ?)",
+                (self.max_bytes,)
             )
 
-            page = await context.new_page()
+    def purge(self, key=None):
+        if key:
+            return self._connect().execute("DELETE FROM scrape_cache WHERE key = ?", (key,)).rowcount
+        return self._connect().execute("DELETE FROM scrape_cache").rowcount
+
+    def list(self, limit=100):
+        rows = self._connect().execute(
+            "SELECT key, url, created_at, accessed_at FROM scrape_cache ORDER BY accessed_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        now = time.time()
+        return [dict(row, age=round(now - row['created_at']), fresh=now - row['created_at'] < self.ttl) for row in rows]
+
+    def stats(self):
+        row = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scrape_cache").fetchone()
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': row[0],
+                'max_entries': self.max_entries,
+                'bytes': row[1],
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'stale': self.stale,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses
+            }
 
-            # Navigate with timeout
-            timeout = 60000 if attempt == 0 else 45000
-            await page.goto(url, wait_until='domcontentloaded', timeout=timeout)
 
-            # Get title
-            result['title'] = await page.title()
-            print(f"Page title: {result['title']}")
+scrape_cache = ScrapeCache(
+    SCRAPE_CACHE_PATH, SCRAPE_CACHE_TTL, SCRAPE_CACHE_STALE, SCRAPE_CACHE_MAX_ENTRIES, SCRAPE_CACHE_MAX_BYTES
+)
+_scrape_flights = {}  # cache key -> {'task', 'waiters'} of the in-flight scrape, only touched on the scraper loop
 
-            # Verify we're on the right page
-            current_url = page.url
-            print(f"Current URL: {current_url}")
 
-            # Extract hero images
-            hero_images, debug_info = await extract_hero_images(page)
-            result['hero_images'] = hero_images
-            result['debug_info'] = debug_info
-            result['hero_image_count'] = len(result['hero_images'])
+async def scrape_and_cache(url, key, intercept=None, screenshot=None):
+    """Scrape and store a successful result (without its screenshot)"""
+    result = await run_scrape(url, False, intercept, screenshot)
+    if result.get('success') and result.get('hero_image_count'):
+        cached = {k: v for k, v in result.items() if k != 'screenshot'}
+        cached['screenshot_base64'] = ''
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, scrape_cache.put, key, url, cached)
+        except sqlite3.Error as e:
+            print(f"Warning: scrape cache write failed: {e}")
+    return result
 
-            # ALWAYS capture screenshot for debugging
-            screenshot = await page.screenshot(type='png', full_page=False)
-            result['screenshot_base64'] = base64.b64encode(screenshot).decode('utf-8')
 
-            result['success'] = True
+async def scrape_shared(url, key, intercept=None):
+    """Single-flight scrape_and_cache - concurrent callers for a key share one scrape
 
-            # Cache for this session (in case of retries)
-            session_cache[cache_key] = result
+    The shared scrape is cancelled only when every caller waiting on it gave up.
+    """
+    flight = _scrape_flights.get(key)
+    if flight is None:
+        task = asyncio.ensure_future(scrape_and_cache(url, key, intercept))
+        flight = _scrape_flights[key] = {'task': task, 'waiters': 0}
 
-            await context.close()
-            await browser.close()
-            await playwright.stop()
+        def forget(_):
+            if _scrape_flights.get(key) is flight:
+                del _scrape_flights[key]
+        task.add_done_callback(forget)
+    flight['waiters'] += 1
+    try:
+        # Shielded so one caller timing out does not cancel the scrape for the others
+        return await asyncio.shield(flight['task'])
+    finally:
+        flight['waiters'] -= 1
+        if flight['waiters'] == 0 and not flight['task'].done():
+            flight['task'].cancel()
 
-            return result
 
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            if browser:
-                try:
-                    await browser.close()
-                except:
-                    pass
-            if playwright:
-                try:
-                    await playwright.stop()
-                except:
-                    pass
+def refresh_in_background(url, key, intercept=None):
+    """Re-scrape a stale entry without making the caller wait"""
+    def log_failure(future):
+        if not future.cancelled() and future.exception():
+            print(f"Background refresh failed for {url}: {future.exception()}")
 
-            if attempt < max_retries - 1:
-                # New session ID for retry (new IP)
-                session_id = f"session_{int(time.time() * 1000)}_{attempt}_{hashlib.md5(url.encode()).hexdigest()[:8]}"
-                proxy_user_with_session = f"{PROXY_USER_BASE}-country-us-session-{session_id}"
-                await asyncio.sleep(2)
-            else:
-                result['error'] = str(e)
+    print(f"Serving stale result, refreshing in background: {url}")
+    future = asyncio.run_coroutine_threadsafe(scrape_shared(url, key, intercept), start_scraper_runtime())
+    future.add_done_callback(log_failure)
 
-    return result
+
+# Batch scrapes - listings run concurrently, each on its own context and
+# proxy session, with results streamed as NDJSON as they complete
+SCRAPE_BATCH_CONCURRENCY = int(os.environ.get('SCRAPE_BATCH_CONCURRENCY', 8))
+SCRAPE_BATCH_MAX_ITEMS = int(os.environ.get('SCRAPE_BATCH_MAX_ITEMS', 500))
+SCRAPE_BATCH_DEADLINE = float(os.environ.get('SCRAPE_BATCH_DEADLINE', 600))
+
+
+def batch_scrape_line(index, url, result, cache_status):
+    """The per-URL NDJSON record - the listing fields without debug payloads"""
+    line = {
+        'index': index,
+        'url': url,
+        'success': bool(result.get('success')),
+        'title': result.get('title', ''),
+        'hero_images': result.get('hero_images', []),
+        'hero_image_count': result.get('hero_image_count', 0),
+        'photos': result.get('photos', []),
+        'cache': cache_status
+    }
+    if result.get('error'):
+        line['error'] = result['error']
+    if result.get('failure'):
+        line['failure'] = result['failure']
+    return line
+
+
+async def run_scrape_batch(groups, concurrency, intercept, emit):
+    """Scrape each (key, url) group under a batch-wide limit, calling emit(key, result)
+
+    emit is called on the scraper loop; failures are emitted as results.
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def scrape_one(key, url):
+        async with limit:
+            try:
+                result = await scrape_shared(url, key, intercept)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = {'success': False, 'url': url, 'error': str(e), 'failure': classify_scrape_failure(e)}
+        emit(key, result)
+
+    await asyncio.gather(*(scrape_one(key, url) for key, url in groups))
 
 
 @app.route('/health', methods=['GET'])
@@ -304,45 +1494,201 @@ def health():
     return jsonify({
         'status': 'healthy',
         'version': VERSION,
-        'session_cache_size': len(session_cache)
+        'scrape_cache': scrape_cache.stats(),
+        'browser_pool': browser_pool.stats() if _scraper_loop is not None else None,
+        'scrapes': dict(scrape_stats, concurrency_limit=SCRAPE_CONCURRENCY, failures=scrape_failure_stats)
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: per-stage scraper latency, attempt outcomes, in-flight gauges, cache hit ratio"""
+    return metrics_response()
+
+
 @app.route('/scrape', methods=['POST'])
 def scrape():
-    """Main scrape endpoint - CLEARS CACHE AT START"""
-
-    # ========================================
-    # STEP 1: CLEAR ALL CACHE/SESSION DATA
-    # This is the FIRST thing we do!
-    # ========================================
-    clear_session()
+    """Main scrape endpoint - served from the scrape cache when possible
 
+    Send "cache": false to skip the cache lookup; the fresh result is still stored.
+    Debug scrapes never touch the cache, screenshot scrapes only write to it.
+    """
     data = request.get_json()
     url = data.get('url')
 
     if not url:
         return jsonify({'error': 'URL is required'}), 400
 
+    try:
+        screenshot = parse_screenshot_options(data.get('screenshot'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+    debug = bool(data.get('debug', SCRAPE_DEBUG))
+    intercept = data.get('intercept')
+    intercept = None if intercept is None else bool(intercept)
+    key = scrape_cache_key(url)
+
+    if not debug and not screenshot and data.get('cache', True) is not False:
+        try:
+            cached = scrape_cache.get(key)
+        except sqlite3.Error as e:
+            print(f"Warning: scrape cache read failed: {e}")
+            cached = None
+        if cached:
+            result, age, fresh = cached
+            if not fresh:
+                refresh_in_background(url, key, intercept)
+            print(f"Scrape cache {'hit' if fresh else 'stale hit'} ({age:.0f}s old): {url}")
+            result['cache'] = {'status': 'hit' if fresh else 'stale', 'age': round(age), 'key': key}
+            return jsonify(result)
+
     print("\n" + "="*60)
     print(f"SCRAPING: {url}")
     print("="*60)
 
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(scrape_with_playwright(url))
-        loop.close()
+        if debug:
+            coro = run_scrape(url, debug, intercept, screenshot)
+        elif screenshot:
+            coro = scrape_and_cache(url, key, intercept, screenshot)
+        else:
+            coro = scrape_shared(url, key, intercept)
+        result = dict(run_on_scraper_loop(coro, SCRAPE_TIMEOUT))
+        result['cache'] = {'status': 'bypass' if debug or screenshot or data.get('cache', True) is False else 'miss',
+                           'key': key}
+        if result.get('screenshot', {}).get('url'):
+            result['screenshot'] = dict(result['screenshot'], url=request.host_url.rstrip('/') + result['screenshot']['url'])
         return jsonify(result)
+    except concurrent.futures.TimeoutError:
+        return jsonify({'error': f'Scrape timed out after {SCRAPE_TIMEOUT:.0f}s', 'success': False}), 504
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
 
 
-@app.route('/clear_cache', methods=['POST'])
-def clear_cache():
-    """Manual cache clear endpoint"""
-    clear_session()
-    return jsonify({'status': 'session cleared', 'success': True})
+@app.route('/scrape/batch', methods=['POST'])
+def scrape_batch():
+    """Scrape many listings with bounded concurrency, streaming NDJSON as each finishes
+
+    Body: {"urls": [...], "concurrency": 8, "deadline": 600, "cache": true}
+    or a bare list. Each output line carries the URL's "index"; URLs still
+    running at the deadline get an error line and their scrapes are cancelled.
+    """
+    data = request.get_json(silent=True)
+    urls = data.get('urls') if isinstance(data, dict) else data
+    options = data if isinstance(data, dict) else {}
+
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'error': 'urls must be a non-empty list', 'success': False}), 400
+
+    if len(urls) > SCRAPE_BATCH_MAX_ITEMS:
+        return jsonify({
+            'error': f"Too many urls ({len(urls)}), max is {SCRAPE_BATCH_MAX_ITEMS}",
+            'success': False
+        }), 413
+
+    try:
+        concurrency = int(options.get('concurrency', SCRAPE_BATCH_CONCURRENCY))
+        deadline_seconds = float(options.get('deadline', SCRAPE_BATCH_DEADLINE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency and deadline must be numbers', 'success': False}), 400
+    concurrency = max(1, min(concurrency, SCRAPE_CONCURRENCY))
+    deadline_seconds = max(1.0, min(deadline_seconds, SCRAPE_TIMEOUT))
+    use_cache = options.get('cache', True) is not False
+    intercept = options.get('intercept')
+    intercept = None if intercept is None else bool(intercept)
+
+    print(f"Scrape batch: {len(urls)} urls, concurrency {concurrency}, deadline {deadline_seconds:.0f}s")
+
+    def stream():
+        deadline = time.monotonic() + deadline_seconds
+        # Duplicate listings are scraped once and reported for every index
+        groups = OrderedDict()
+        for index, url in enumerate(urls):
+            if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+                yield json.dumps({'index': index, 'url': url, 'success': False,
+                                  'error': 'url must be an http(s) URL'}) + "\n"
+                continue
+            groups.setdefault(scrape_cache_key(url), (url, []))[1].append(index)
+
+        to_scrape = []
+        for key, (url, indexes) in groups.items():
+            cached = None
+            if use_cache:
+                try:
+                    cached = scrape_cache.get(key)
+                except sqlite3.Error as e:
+                    print(f"Warning: scrape cache read failed: {e}")
+            if cached:
+                result, _, fresh = cached
+                if not fresh:
+                    refresh_in_background(url, key, intercept)
+                for index in indexes:
+                    yield json.dumps(batch_scrape_line(index, urls[index], result, 'hit' if fresh else 'stale')) + "\n"
+            else:
+                to_scrape.append((key, url))
+
+        if not to_scrape:
+            return
+
+        results = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            run_scrape_batch(to_scrape, concurrency, intercept, lambda key, result: results.put((key, result))),
+            start_scraper_runtime()
+        )
+        pending = {key for key, _ in to_scrape}
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    key, result = results.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.discard(key)
+                for index in groups[key][1]:
+                    yield json.dumps(batch_scrape_line(index, urls[index], result, 'miss' if use_cache else 'bypass')) + "\n"
+
+            for key in pending:
+                for index in groups[key][1]:
+                    yield json.dumps({'index': index, 'url': urls[index], 'success': False,
+                                      'error': f"Batch deadline of {deadline_seconds:.0f}s exceeded",
+                                      'failure': 'timeout'}) + "\n"
+        finally:
+            # Deadline hit or client went away - stop whatever is still running
+            future.cancel()
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+
+@app.route('/screenshots/<name>', methods=['GET'])
+def get_screenshot(name):
+    """Serve a stored screenshot; names are content hashes so they never change"""
+    if not SCREENSHOT_NAME_RE.match(name):
+        return jsonify({'error': 'Screenshot not found', 'success': False}), 404
+    if not os.path.exists(os.path.join(SCREENSHOT_STORE_DIR, name)):
+        return jsonify({'error': 'Screenshot not found', 'success': False}), 404
+    response = send_from_directory(os.path.abspath(SCREENSHOT_STORE_DIR), name,
+                                   mimetype=SCREENSHOT_FORMATS[name.rsplit('.', 1)[1]])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@app.route('/scrape/cache', methods=['GET'])
+def list_scrape_cache():
+    """Inspect the scrape cache: stats plus the most recently served entries (?limit=100)"""
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify({'stats': scrape_cache.stats(), 'entries': scrape_cache.list(limit)})
+
+
+@app.route('/scrape/cache', methods=['DELETE'])
+def purge_scrape_cache():
+    """Purge the scrape cache: everything, or one listing with ?url="""
+    url = request.args.get('url')
+    purged = scrape_cache.purge(scrape_cache_key(url) if url else None)
+    print(f"Purged {purged} scrape cache entries")
+    return jsonify({'success': True, 'purged': purged})
 
 
 
@@ -400,9 +1746,15 @@ def generate_qr():
         return jsonify({"error": str(e), "success": False}), 500
 
 
+# Launch the browsers at startup rather than on the first request
+start_scraper_runtime()
+
+
 if __name__ == '__main__':
+    start_scraper_runtime()
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    # Threaded so each waiting /scrape request only costs an idle thread
+    app.run(host='0.0.0.0', port=port, threaded=True)
 
 @app.route('/update-highlevel-contact', methods=['POST'])
 def update_highlevel_contact():
@@ -0,0 +1,108 @@
+"""QR rendering - kept free of the Flask app so the batch process pool
+(spawned children) imports only this, not app.py and its startup work
+
+The module matrix is expanded by whole pixels instead of resampling a
+box_size=10 render, so edges stay crisp and PNGs stay 1-bit.
+"""
+import io
+
+import qrcode
+from PIL import Image
+
+from metrics import QR_STAGE_SECONDS, timed
+
+QR_DEFAULT_BOX_SIZE = 10
+
+
+def build_qr_matrix(url, border_size=4):
+    """Return the QR module matrix (quiet zone included) as rows of booleans"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        border=border_size,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def rasterize_qr_matrix(matrix, size):
+    """Scale a module matrix to size x size pixels as a 1-bit PIL image
+
+    Each module becomes an integer block of pixels; any leftover pixels are
+    split around the code as extra quiet zone. Without a size, modules are
+    QR_DEFAULT_BOX_SIZE pixels wide (the old make_image() output size).
+    """
+    modules = len(matrix)
+    pixels = bytes(0 if dark else 255 for row in matrix for dark in row)
+    image = Image.frombytes('L', (modules, modules), pixels).convert('1', dither=Image.Dither.NONE)
+
+    if not size or size <= 0:
+        size = modules * QR_DEFAULT_BOX_SIZE
+
+    if size < modules:
+        # Less than a pixel per module - nothing better than nearest sampling
+        return image.resize((size, size), Image.Resampling.NEAREST)
+
+    scale = size // modules
+    image = image.resize((modules * scale, modules * scale), Image.Resampling.NEAREST)
+    if modules * scale == size:
+        return image
+
+    canvas = Image.new('1', (size, size), 1)
+    offset = (size - modules * scale) // 2
+    canvas.paste(image, (offset, offset))
+    return canvas
+
+
+def qr_matrix_to_svg(matrix, size):
+    """Render a module matrix as an SVG document with one merged path"""
+    modules = len(matrix)
+    if not size or size <= 0:
+        size = modules * QR_DEFAULT_BOX_SIZE
+
+    # One subpath per horizontal run of dark modules keeps the document small
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < modules:
+            if not row[x]:
+                x += 1
+                continue
+            run = 1
+            while x + run < modules and row[x + run]:
+                run += 1
+            path.append(f"M{x} {y}h{run}v1h-{run}z")
+            x += run
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    ).encode('utf-8')
+
+
+def render_qr_image(url, size=400, border_size=4, image_format='png'):
+    """Render a QR code for url and return the encoded image bytes"""
+    with timed(QR_STAGE_SECONDS, stage='make'):
+        matrix = build_qr_matrix(url, border_size)
+
+    if image_format == 'svg':
+        with timed(QR_STAGE_SECONDS, stage='svg'):
+            return qr_matrix_to_svg(matrix, size)
+
+    with timed(QR_STAGE_SECONDS, stage='rasterize'):
+        qr_image = rasterize_qr_matrix(matrix, size)
+    with timed(QR_STAGE_SECONDS, stage='encode'):
+        buffer = io.BytesIO()
+        qr_image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_qr_batch_item(index, url, size, border_size, image_format):
+    """Process pool task - render one batch item, reporting errors instead of raising"""
+    try:
+        return {"index": index, "image": render_qr_image(url, size, border_size, image_format)}
+    except Exception as e:
+        return {"index": index, "error": str(e)}